@@ -0,0 +1,104 @@
+"""
+Benchmark of the download path (run.py -d) against the local replay server, without network.
+
+The corpus is a data folder from a previous download (plain files or archives), e.g.:
+
+    $ python benchmarks/crawl.py --corpus ../data --start 2015 --end 2016 --workers 8 --latency 0.05
+
+The crawl writes into a temporary data folder, the corpus is never modified. With --refresh, it crawls again as
+run.py -d --refresh does and exits with an error if any unchanged page is downloaded again instead of being answered
+with a 304.
+"""
+import os, sys, time, argparse, tempfile, threading, logging
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100.0 * (len(values) - 1))))] if values else 0.0
+
+
+def main(args):
+    corpus = os.path.abspath(args.corpus)
+
+    # The data paths are relative to the working directory ('../data'), so we crawl from a temporary one.
+    tmp_path = tempfile.mkdtemp(prefix='acb-crawl-')
+    os.makedirs(os.path.join(tmp_path, 'data'))
+    os.makedirs(os.path.join(tmp_path, 'work'))
+    os.chdir(os.path.join(tmp_path, 'work'))
+
+    from src.replay import ReplayServer
+    import src.season
+    from src.download import SESSION
+    from run import download_games
+
+    server = ReplayServer(corpus, latency=args.latency, error_rate=args.error_rate,
+                          not_found_rate=args.not_found_rate, body_rate=args.body_rate).start()
+    src.season.BASE_URL = server.base_url
+
+    latencies = []
+    lock = threading.Lock()
+    fetch = SESSION.fetch
+
+    def timed_fetch(url, conditional=False):
+        start = time.monotonic()
+        try:
+            return fetch(url, conditional)
+        finally:
+            with lock:
+                latencies.append(time.monotonic() - start)
+
+    SESSION.fetch = timed_fetch
+
+    start = time.monotonic()
+    for year in reversed(range(args.first_season, args.last_season + 1)):
+        try:
+            download_games(src.season.Season(year), workers=args.workers, repair=args.repair)
+        except Exception as error:  # the faults injected might make the sanity check fail.
+            logging.error('Season {}: {}'.format(year, error))
+    elapsed = time.monotonic() - start
+
+    print('Pages:            {}'.format(len(latencies)))
+    print('Elapsed:          {:.2f}s'.format(elapsed))
+    print('Pages per second: {:.1f}'.format(len(latencies) / elapsed if elapsed else 0.0))
+    for q in (50, 95, 99):
+        print('Latency p{}:      {:.1f}ms'.format(q, percentile(latencies, q) * 1000))
+    print('Server responses: {}'.format(dict(sorted(server.requests.items()))))
+    print('Dead letters:     {}'.format(len(SESSION.scheduler.dead_letters)))
+    print('Output:           {}'.format(os.path.join(tmp_path, 'data')))
+
+    if args.refresh:  # crawl again with --refresh: the pages haven't changed, acb.com should answer 304s.
+        with server.lock:
+            server.requests.clear()
+        SESSION.revalidate = True
+        SESSION._revalidated.clear()  # as in a new run.
+        for year in reversed(range(args.first_season, args.last_season + 1)):
+            try:
+                download_games(src.season.Season(year), workers=args.workers, repair=args.repair)
+            except Exception as error:
+                logging.error('Season {}: {}'.format(year, error))
+        print('Refresh responses: {}'.format(dict(sorted(server.requests.items()))))
+
+        if not args.error_rate and not args.not_found_rate and server.requests.get(200, 0):
+            server.shutdown()
+            sys.exit('{} unchanged pages were downloaded again with --refresh'.format(server.requests[200]))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", action='store', dest="corpus", default=os.path.join('..', 'data'))
+    parser.add_argument("--start", action='store', dest="first_season", default=2016, type=int)
+    parser.add_argument("--end", action='store', dest="last_season", default=2016, type=int)
+    parser.add_argument("--workers", action='store', dest="workers", default=8, type=int)
+    parser.add_argument("--repair", action='store_true', default=False)
+    parser.add_argument("--refresh", action='store_true', default=False,
+                        help="crawl again revalidating the pages, and check they are answered with 304s")
+    parser.add_argument("--latency", action='store', dest="latency", default=0.05, type=float)
+    parser.add_argument("--error-rate", action='store', dest="error_rate", default=0.0, type=float)
+    parser.add_argument("--not-found-rate", action='store', dest="not_found_rate", default=0.0, type=float)
+    parser.add_argument("--body-rate", action='store', dest="body_rate", default=0, type=int)
+
+    main(parser.parse_args())
@@ -0,0 +1,63 @@
+"""
+Benchmark of the load phase of a new database (run.py -r --load) with the default settings of SQLite and with the
+bulk load profile (deferred indexes, WAL, no syncs, big page cache and ANALYZE at the end).
+
+It loads the staging files of a data folder (see run.py --extract) into temporary databases, e.g.:
+
+    $ python benchmarks/load.py --data ../data --start 2010 --end 2016
+
+The data folder is never modified.
+"""
+import os, sys, time, argparse, tempfile, contextlib
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+
+def load(seasons, bulk):
+    from models.basemodel import reset_database, bulk_load
+    from src.staging import read_staging
+    from run import load_games
+
+    reset_database(defer_indexes=bulk, db_path=os.path.join(tempfile.mkdtemp(prefix='acb-load-'), 'database.db'))
+
+    start = time.monotonic()
+    with bulk_load() if bulk else contextlib.nullcontext():
+        for season in seasons:
+            load_games(season, read_staging(season))
+    return time.monotonic() - start
+
+
+def main(args):
+    data_path = os.path.abspath(args.data)
+
+    # The data paths are relative to the working directory ('../data').
+    tmp_path = tempfile.mkdtemp(prefix='acb-load-')
+    os.symlink(data_path, os.path.join(tmp_path, 'data'))
+    os.makedirs(os.path.join(tmp_path, 'work'))
+    os.chdir(os.path.join(tmp_path, 'work'))
+
+    from src.season import Season
+    from src.staging import has_staging
+
+    seasons = [Season(year) for year in reversed(range(args.first_season, args.last_season + 1))]
+    seasons = [season for season in seasons if has_staging(season)]
+    if not seasons:
+        sys.exit('No staging files in {}, run run.py --extract first'.format(data_path))
+
+    default_elapsed = load(seasons, bulk=False)
+    bulk_elapsed = load(seasons, bulk=True)
+
+    print('Seasons:          {}'.format(len(seasons)))
+    print('Default settings: {:.2f}s'.format(default_elapsed))
+    print('Bulk load:        {:.2f}s'.format(bulk_elapsed))
+    print('Speedup:          {:.1f}x'.format(default_elapsed / bulk_elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", action='store', dest="data", default=os.path.join('..', 'data'))
+    parser.add_argument("--start", action='store', dest="first_season", default=2016, type=int)
+    parser.add_argument("--end", action='store', dest="last_season", default=2016, type=int)
+
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+"""
+Equivalence check and benchmark of the extractor of the game pages (src.extractor) against the pyquery parser it
+replaced, over the game pages of the frozen corpus (benchmarks/corpus) or of a data folder (plain files or archives),
+e.g.:
+
+    $ python benchmarks/parse.py
+    $ python benchmarks/parse.py --corpus ../data --start 2015 --end 2016
+
+It exits with an error, and the fields that differ, if the extractor doesn't return exactly the same values as pyquery
+for any page. tests/test_extractor.py runs the same check over the corpus with pytest.
+"""
+import os, re, sys, time, argparse
+from pyquery import PyQuery as pq
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+from src.download import stored_files, read_content
+from src.game_page import GamePage
+
+CORPUS_PATH = os.path.join(ROOT_PATH, 'benchmarks', 'corpus')
+FIELDS = ['team_names', 'schedule', 'quarter_scores', 'referees', 'header', 'rows']
+
+
+def reference_game(raw_game, estadisticas_tag):
+    """
+    The pyquery parser of the game pages, as it was before src.extractor.
+
+    :param raw_game: String
+    :param estadisticas_tag: String
+    :return: tuple with the team_names, schedule, quarter_scores, referees, header and rows of GamePage.
+    """
+    doc = pq(raw_game)
+    info_game_data = doc(estadisticas_tag).eq(0)
+    info_players_data = doc(estadisticas_tag).eq(1)
+
+    team_names = []
+    for i in [0, 2]:
+        team_data = info_players_data('.estverde').eq(i)('td').eq(0).text()
+        team_names.append(re.search("(.*) [0-9]", team_data).groups()[0])
+
+    scheduling_data = info_game_data('.estnegro')('td').eq(0).text()
+    schedule = tuple(map(lambda x: x.strip(), scheduling_data.split("|")))
+
+    quarters_data = info_game_data('.estnaranja')('td')
+    quarter_scores = [quarters_data.eq(i).text() for i in range(2, 7)]
+
+    referees_data = quarters_data.eq(0).text()
+    referees = []
+    if referees_data:
+        referees = referees_data.split(":")[1].strip().split(",")
+        referees = list(filter(None, referees))
+        referees = list(map(lambda x: x.strip(), referees))
+
+    header = [td.text() for td in info_players_data('tr').eq(1)('td').items()]
+
+    rows = []
+    for tr in info_players_data('tr').items():
+        if tr('.estverde'):
+            if tr.eq(0)('.estverdel'):
+                rows.append((True, []))
+        else:
+            cells = []
+            for td in tr('td').items():
+                link = td('a')
+                cells.append((td.text(), link.attr('href') if link else None, bool(td('.gristit'))))
+            rows.append((False, cells))
+
+    return team_names, schedule, quarter_scores, referees, header, rows
+
+
+def main(args):
+    paths = []
+    for year in range(args.first_season, args.last_season + 1):
+        games_path = os.path.join(args.corpus, str(year), 'games')
+        if os.path.isdir(games_path) or os.path.exists(games_path + '.pack'):
+            paths.extend(stored_files(games_path))
+
+    pages = [(file_path, read_content(file_path)) for file_path in paths]
+    pages = [(file_path, page) for file_path, page in pages if not GamePage._is_blank(page)]
+    if not pages:
+        sys.exit('No game pages in {}'.format(args.corpus))
+
+    start = time.monotonic()
+    game_pages = [GamePage(page) for _, page in pages]
+    extractor_elapsed = time.monotonic() - start
+
+    start = time.monotonic()
+    expected = [reference_game(game_page.raw_game, game_page.estadisticas_tag) for game_page in game_pages]
+    reference_elapsed = time.monotonic() - start
+
+    mismatches = []
+    for (file_path, _), game_page, expected_values in zip(pages, game_pages, expected):
+        fields = [field for field, expected_value in zip(FIELDS, expected_values)
+                  if getattr(game_page, field) != expected_value]
+        if fields:
+            mismatches.append('{} ({})'.format(file_path, ', '.join(fields)))
+
+    print('Pages:              {}'.format(len(pages)))
+    print('pyquery:            {:.1f} pages/s'.format(len(pages) / reference_elapsed))
+    print('extractor:          {:.1f} pages/s'.format(len(pages) / extractor_elapsed))
+    print('Speedup:            {:.1f}x'.format(reference_elapsed / extractor_elapsed))
+    print('Mismatches:         {}'.format(len(mismatches)))
+    if mismatches:  # not an assert, it must fail with python -O as well.
+        sys.exit('The extractor differs from pyquery in:\n' + '\n'.join(mismatches))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", action='store', dest="corpus", default=CORPUS_PATH)
+    parser.add_argument("--start", action='store', dest="first_season", default=1994, type=int)
+    parser.add_argument("--end", action='store', dest="last_season", default=2016, type=int)
+
+    main(parser.parse_args())
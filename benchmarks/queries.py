@@ -0,0 +1,83 @@
+"""
+Benchmark of the lookups of models/queries.py, and of the leaderboards of models/aggregates.py, on a database: every
+lookup is run for a sample of players, teams and seasons, and its median and worst times are printed, e.g.:
+
+    $ python benchmarks/queries.py --database ../data/database.db
+
+The lookups run on a copy of the database, where the indexes of schema.sql and the aggregates are created if they
+are missing (e.g. a database created before them). The database itself is never modified.
+"""
+import os, sys, time, random, shutil, argparse, tempfile, statistics
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+SAMPLE_SIZE = 200
+
+
+def measure(lookup, arguments):
+    """
+    :param lookup: function
+    :param arguments: list of tuples
+    :return: (median, max) time in milliseconds.
+    """
+    times = []
+    for args in arguments:
+        start = time.perf_counter()
+        lookup(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), max(times)
+
+
+def main(args):
+    database = os.path.abspath(args.database)  # before moving to the working directory.
+
+    # The data paths are relative to the working directory ('../data').
+    tmp_path = tempfile.mkdtemp(prefix='acb-queries-')
+    os.makedirs(os.path.join(tmp_path, 'data'))
+    os.makedirs(os.path.join(tmp_path, 'work'))
+    os.chdir(os.path.join(tmp_path, 'work'))
+    db_path = os.path.join(tmp_path, 'database.db')
+    shutil.copy(database, db_path)
+
+    from models.basemodel import DATABASE, migrate_database
+    from models.aggregates import refresh_aggregates, get_leaderboard
+    from models import queries
+
+    DATABASE.init(db_path)
+    DATABASE.connect()
+    migrate_database()  # the aggregates and the composite indexes, if the database is older than them.
+    seasons = [row[0] for row in DATABASE.execute_sql('SELECT DISTINCT {} FROM game g'.format(queries.SEASON))]
+    if not DATABASE.execute_sql('SELECT COUNT(*) FROM playerSeason').fetchone()[0]:
+        refresh_aggregates(seasons)
+    DATABASE.execute_sql('ANALYZE')
+
+    random.seed(args.seed)
+    actors = [row[0] for row in DATABASE.execute_sql('SELECT id FROM actor')]
+    teams = [row[0] for row in DATABASE.execute_sql('SELECT id FROM team')]
+    lookups = [
+        ('Player game log', queries.get_player_game_log,
+         [(random.choice(actors),) for _ in range(SAMPLE_SIZE)]),
+        ('Player season log', queries.get_player_game_log,
+         [(random.choice(actors), random.choice(seasons)) for _ in range(SAMPLE_SIZE)]),
+        ('Team game log', queries.get_team_game_log,
+         [(random.choice(teams), random.choice(seasons)) for _ in range(SAMPLE_SIZE)]),
+        ('Head to head', queries.get_head_to_head,
+         [tuple(random.sample(teams, 2)) for _ in range(SAMPLE_SIZE)]),
+        ('Leaderboard', get_leaderboard,
+         [(random.choice(seasons), random.choice(['point', 'assist', 'efficiency', 't3_pct']), 'playerSeason', True)
+          for _ in range(SAMPLE_SIZE)])]
+
+    print('{:<20} {:>12} {:>12}'.format('Lookup', 'median (ms)', 'max (ms)'))
+    for name, lookup, arguments in lookups:
+        print('{:<20} {:>12.2f} {:>12.2f}'.format(name, *measure(lookup, arguments)))
+    DATABASE.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", action='store', dest="database",
+                        default=os.path.join(ROOT_PATH, 'data', 'database.db'))
+    parser.add_argument("--seed", action='store', dest="seed", default=0, type=int)
+
+    main(parser.parse_args())
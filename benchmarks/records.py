@@ -0,0 +1,76 @@
+"""
+Memory of the records of the games during the ingest: for each season of a corpus, the pages are parsed into records
+and kept in memory, as extract_games does before loading them, and they are written to and read from the staging
+files. It prints the peak RSS of the process, the peak of the Python allocations and the number of blocks alive
+with the records, e.g.:
+
+    $ python benchmarks/records.py --corpus ../data --start 2015 --end 2016
+
+Each season is measured in its own process. The corpus is never modified.
+"""
+import os, sys, argparse, tempfile, resource, tracemalloc, multiprocessing
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+
+def measure_season(corpus, year, work_path):
+    """
+    :param corpus: String
+    :param year: int
+    :param work_path: String, working directory, next to a temporary data folder.
+    :return: (pages, peak RSS in MB, peak of the allocations in MB, blocks alive with the records)
+    """
+    os.chdir(work_path)
+    from src.download import stored_files
+    from src.ingest import parse_game
+    from src.staging import write_staging, read_staging
+    from src.constants import get_acbid
+
+    class StagingSeason:  # only the folder of the staging files is needed.
+        SEASON_PATH = os.path.join('..', 'data', str(year))
+
+    tasks = []
+    for file_path in stored_files(os.path.join(corpus, str(year), 'games')):
+        id_game_number = int(os.path.splitext(os.path.basename(file_path))[0])
+        tasks.append((file_path, id_game_number, get_acbid(year, id_game_number), None))
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    records = [parse_game(task) for task in tasks]
+    write_staging(StagingSeason, records)
+    records = read_staging(StagingSeason)
+    blocks = len(tracemalloc.take_snapshot().traces)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    return len(records), rss / 1024.0, peak / 1024.0 / 1024.0, blocks
+
+
+def main(args):
+    corpus = os.path.abspath(args.corpus)
+
+    # The data paths are relative to the working directory ('../data').
+    tmp_path = tempfile.mkdtemp(prefix='acb-records-')
+    os.makedirs(os.path.join(tmp_path, 'data'))
+    os.makedirs(os.path.join(tmp_path, 'work'))
+
+    print('{:<8} {:>6} {:>14} {:>16} {:>14}'.format('Season', 'Pages', 'RSS peak (MB)', 'Alloc peak (MB)',
+                                                     'Live blocks'))
+    context = multiprocessing.get_context('spawn')
+    for year in range(args.first_season, args.last_season + 1):
+        if not os.path.isdir(os.path.join(corpus, str(year), 'games')) and \
+                not os.path.exists(os.path.join(corpus, str(year), 'games.pack')):
+            continue
+        with context.Pool(1) as pool:
+            pages, rss, peak, blocks = pool.apply(measure_season, (corpus, year, os.path.join(tmp_path, 'work')))
+        print('{:<8} {:>6} {:>14.1f} {:>16.1f} {:>14}'.format(year, pages, rss, peak, blocks))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", action='store', dest="corpus", default=os.path.join('..', 'data'))
+    parser.add_argument("--start", action='store', dest="first_season", default=2016, type=int)
+    parser.add_argument("--end", action='store', dest="last_season", default=2016, type=int)
+
+    main(parser.parse_args())
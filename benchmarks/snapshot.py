@@ -0,0 +1,85 @@
+"""
+Benchmark of the columnar snapshot (src.snapshot) against reading the participants from SQLite, as the notebooks
+did: the time to open the data and the time to compute the points per game of every player.
+
+The snapshot is exported into a temporary folder from a database, e.g.:
+
+    $ python benchmarks/snapshot.py --database ../data/database.db
+
+The database is never modified.
+"""
+import os, sys, time, sqlite3, argparse, tempfile
+from collections import defaultdict
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+from src.snapshot import export_snapshot, Snapshot
+
+PLAYERS_CONDITION = 'NOT is_coach AND NOT is_referee AND actor_id IS NOT NULL'
+
+
+def sqlite_points(database):
+    """
+    :param database: String
+    :return: (seconds to read the participants, seconds to group them, dict {actor_id: points per game})
+    """
+    start = time.monotonic()
+    connection = sqlite3.connect(database)
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(participant)')]
+    rows = connection.execute('SELECT * FROM participant').fetchall()  # what pandas.read_sql does underneath.
+    connection.close()
+    read_elapsed = time.monotonic() - start
+
+    start = time.monotonic()
+    actor, point = columns.index('actor_id'), columns.index('point')
+    is_coach, is_referee = columns.index('is_coach'), columns.index('is_referee')
+    sums, counts = defaultdict(float), defaultdict(int)
+    for row in rows:
+        if row[actor] is not None and row[is_coach] == 0 and row[is_referee] == 0 and row[point] is not None:
+            sums[row[actor]] += row[point]
+            counts[row[actor]] += 1
+    means = {actor_id: sums[actor_id] / counts[actor_id] for actor_id in sums}
+    return read_elapsed, time.monotonic() - start, means
+
+
+def snapshot_points(snapshot_path):
+    """
+    :param snapshot_path: String
+    :return: (seconds to open the snapshot, seconds to group the participants, dict {actor_id: points per game})
+    """
+    start = time.monotonic()
+    snapshot = Snapshot(snapshot_path)
+    open_elapsed = time.monotonic() - start
+
+    start = time.monotonic()
+    keys, means = snapshot.group_mean('point', by='actor', mask=snapshot.players())
+    return open_elapsed, time.monotonic() - start, dict(zip(keys.tolist(), means.tolist()))
+
+
+def main(args):
+    snapshot_path = os.path.join(tempfile.mkdtemp(prefix='acb-snapshot-'), 'snapshot')
+    start = time.monotonic()
+    export_snapshot(args.database, snapshot_path)
+    export_elapsed = time.monotonic() - start
+
+    sqlite_read, sqlite_group, expected = sqlite_points(args.database)
+    snapshot_open, snapshot_group, means = snapshot_points(snapshot_path)
+
+    mismatches = [actor_id for actor_id in expected if abs(expected[actor_id] - means.get(actor_id, -1)) > 1e-6]
+    print('Export:             {:.2f}s'.format(export_elapsed))
+    print('SQLite read:        {:.3f}s'.format(sqlite_read))
+    print('Snapshot open:      {:.3f}s'.format(snapshot_open))
+    print('SQLite group-by:    {:.3f}s'.format(sqlite_group))
+    print('Snapshot group-by:  {:.3f}s'.format(snapshot_group))
+    print('Mismatches:         {}'.format(len(mismatches)))
+    if mismatches or len(means) != len(expected):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", action='store', dest="database",
+                        default=os.path.join(ROOT_PATH, 'data', 'database.db'))
+
+    main(parser.parse_args())
@@ -0,0 +1,245 @@
+"""
+Benchmark suite of the ingest over the frozen corpus of benchmarks/corpus, to see the regressions between commits.
+
+The corpus has the same layout as the data folder: a season with the old statistics table (2003, .estadisticas) and
+a season with the new one (2016, .estadisticasnew), each one with 6 teams, 30 games of regular season and 9 of
+playoff (the last one blank) and its standing, playoff and relegation pages, and a few pages of players, coaches and
+teams. It times, for each layout when it applies:
+
+ - game_page: parsing the pages of the games into GamePages.
+ - game.create_instance: Game.create_instance of the games of the regular season.
+ - participant.create_instances: Participant.create_instances of those games.
+ - season.metadata: the derivation of the metadata of a season from its pages, and from its metadata file (cached).
+ - actor.personal_info: Actor._get_personal_info of the players and coaches.
+ - team.founded_year: Team._get_founded_year of the teams.
+ - insert_games: a full insert_games of a season into an empty database.
+
+The results are saved in benchmarks/results/<commit>.json (ignored by git, --results to save them elsewhere), and they
+can be compared with the ones of another commit, e.g.:
+
+    $ git checkout master && python benchmarks/suite.py
+    $ git checkout my-branch && python benchmarks/suite.py --compare master
+
+It exits with an error if the median of any benchmark is more than REGRESSION_THRESHOLD slower. The corpus is copied
+into a temporary data folder, so it is never modified.
+"""
+import os, sys, json, time, shutil, logging, argparse, platform, datetime, statistics, subprocess, tempfile
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+CORPUS_PATH = os.path.join(ROOT_PATH, 'benchmarks', 'corpus')
+RESULTS_PATH = os.path.join(ROOT_PATH, 'benchmarks', 'results')
+LAYOUTS = {'old': 2003, 'new': 2016}  # season of the corpus with each statistics table.
+ROUNDS = 5
+REGRESSION_THRESHOLD = 0.1
+
+
+def measure(run, setup=None, rounds=ROUNDS):
+    """
+    :param run: function without arguments, the code timed.
+    :param setup: function without arguments, called before every round without being timed.
+    :param rounds: int
+    :return: list of floats, the seconds of each round.
+    """
+    times = []
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_suite(rounds):
+    """
+    Run the benchmarks in the working directory, next to the copy of the corpus ('../data').
+
+    :param rounds: int
+    :return: dict {name: (number of items, list of seconds of each round)}
+    """
+    from models.basemodel import DATABASE, reset_database
+    from models.game import Game
+    from models.team import Team
+    from models.actor import Actor
+    from models.participant import Participant
+    from src.season import Season, TEAMS_PATH, PLAYERS_PATH, COACHES_PATH
+    from src.download import stored_files, read_content
+    from src.game_page import GamePage
+    from run import insert_games
+
+    db_path = os.path.abspath(os.path.join('..', 'database.db'))
+    results = dict()
+    for layout, year in sorted(LAYOUTS.items()):
+        season = Season(year)
+        contents = [read_content(os.path.join(season.GAMES_PATH, '{}.html'.format(id_game_number)))
+                    for id_game_number in range(1, season.get_number_games() + 1)]
+        results['game_page[{}]'.format(layout)] = (len(contents), measure(
+            lambda: [GamePage(content) for content in contents], rounds=rounds))
+
+        game_pages = [(id_game_number, GamePage(content)) for id_game_number, content in
+                      enumerate(contents[:season.get_number_games_regular_season()], start=1)]
+
+        def create_teams():
+            reset_database(db_path=db_path)
+            Team.create_instances(season)
+
+        def create_games():
+            with DATABASE.atomic():  # as in load_games, not a transaction per game.
+                for id_game_number, game_page in game_pages:
+                    Game.create_instance(game_page, id_game_number, season)
+        results['game.create_instance[{}]'.format(layout)] = (len(game_pages), measure(
+            create_games, setup=create_teams, rounds=rounds))
+
+        games = [Game.get(Game.acbid == Game.get_acbid(season, id_game_number)) for id_game_number, _ in game_pages]
+
+        def delete_participants():
+            Participant.delete().execute()
+            Actor.delete().execute()
+
+        def create_participants():
+            with DATABASE.atomic():
+                for (_, game_page), game in zip(game_pages, games):
+                    Participant.create_instances(game_page, game)
+        results['participant.create_instances[{}]'.format(layout)] = (len(game_pages), measure(
+            create_participants, setup=delete_participants, rounds=rounds))
+
+        def delete_metadata():
+            os.remove(season.METADATA_PATH)
+
+        def derive_metadata():
+            metadata_season = Season(year)
+            metadata_season.get_teams_ids()
+            metadata_season.get_games_breakdown()
+            metadata_season.get_relegation_teams()
+        results['season.metadata[{}]'.format(layout)] = (1, measure(
+            derive_metadata, setup=delete_metadata, rounds=rounds))
+        results['season.metadata_cached[{}]'.format(layout)] = (1, measure(derive_metadata, rounds=rounds))
+
+        results['insert_games[{}]'.format(layout)] = (len(contents), measure(
+            lambda: insert_games(season), setup=lambda: reset_database(db_path=db_path), rounds=rounds))
+
+    actors = [read_content(file_path) for file_path in stored_files(PLAYERS_PATH) + stored_files(COACHES_PATH)]
+    results['actor.personal_info'] = (len(actors), measure(
+        lambda: [Actor._get_personal_info(actor) for actor in actors], rounds=rounds))
+
+    teams = [read_content(file_path) for file_path in stored_files(TEAMS_PATH)]
+    results['team.founded_year'] = (len(teams), measure(
+        lambda: [Team._get_founded_year(team) for team in teams], rounds=rounds))
+
+    DATABASE.close()
+    return results
+
+
+def get_commit():
+    """
+    :return: String, the short hash of HEAD, with '-dirty' if the tracked files have changes. None outside of git.
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_PATH,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+        changes = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT_PATH)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + '-dirty' if changes.strip() else commit
+
+
+def load_results(revision, results_path=RESULTS_PATH):
+    """
+    :param revision: String, a commit, branch or tag, or the path of a results file.
+    :param results_path: String, folder of the results.
+    :return: dict, the results saved for it.
+    """
+    if os.path.isfile(revision):
+        path = revision
+    else:
+        try:
+            commit = subprocess.check_output(['git', 'rev-parse', '--short', revision], cwd=ROOT_PATH,
+                                             stderr=subprocess.DEVNULL).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = revision
+        path = os.path.join(results_path, commit + '.json')
+    if not os.path.exists(path):
+        sys.exit('No results for {} ({}), run the suite in that commit first'.format(revision, path))
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(previous, current):
+    """
+    Print the change of the median of every benchmark.
+
+    :param previous: dict, results of the reference commit.
+    :param current: dict, results of this run.
+    :return: list of Strings, the benchmarks that are slower than the threshold.
+    """
+    print('\nCompared with {}:'.format(previous['commit']))
+    regressions = []
+    for name, result in sorted(current['benchmarks'].items()):
+        if name not in previous['benchmarks']:
+            print('{:<38} {:>10} {:>10.2f}ms'.format(name, 'new', result['median'] * 1000))
+            continue
+        before = previous['benchmarks'][name]['median']
+        change = result['median'] / before - 1
+        flag = ''
+        if change > REGRESSION_THRESHOLD:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        print('{:<38} {:>8.2f}ms {:>8.2f}ms {:>+7.1%} {}'.format(name, before * 1000, result['median'] * 1000, change,
+                                                                 flag))
+    return regressions
+
+
+def main(args):
+    logging.disable(logging.INFO)  # the ingest logs every step.
+    results_path = os.path.abspath(args.results)
+    # Loaded before they are overwritten by this run.
+    previous = load_results(args.compare, results_path) if args.compare else None
+
+    # The data paths are relative to the working directory ('../data').
+    tmp_path = tempfile.mkdtemp(prefix='acb-suite-')
+    shutil.copytree(CORPUS_PATH, os.path.join(tmp_path, 'data'))
+    os.makedirs(os.path.join(tmp_path, 'work'))
+    os.chdir(os.path.join(tmp_path, 'work'))
+    try:
+        benchmarks = run_suite(args.rounds)
+    finally:
+        os.chdir(ROOT_PATH)
+        shutil.rmtree(tmp_path)
+
+    commit = get_commit()
+    results = {'commit': commit, 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'machine': platform.platform(), 'rounds': args.rounds,
+               'benchmarks': {name: {'items': items, 'min': min(times), 'median': statistics.median(times)}
+                              for name, (items, times) in benchmarks.items()}}
+
+    print('{:<38} {:>6} {:>10} {:>10} {:>12}'.format('Benchmark', 'Items', 'Min', 'Median', 'Items/s'))
+    for name, result in sorted(results['benchmarks'].items()):
+        print('{:<38} {:>6} {:>8.2f}ms {:>8.2f}ms {:>12.1f}'.format(name, result['items'], result['min'] * 1000,
+                                                                      result['median'] * 1000,
+                                                                      result['items'] / result['median']))
+
+    if commit is not None:
+        os.makedirs(results_path, exist_ok=True)
+        path = os.path.join(results_path, commit + '.json')
+        with open(path, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print('\nResults saved in {}'.format(path))
+
+    if previous is not None:
+        regressions = compare(previous, results)
+        if regressions:
+            sys.exit('{} benchmarks are more than {:.0%} slower: {}'.format(len(regressions), REGRESSION_THRESHOLD,
+                                                                           ', '.join(regressions)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", action='store', dest="rounds", default=ROUNDS, type=int)
+    parser.add_argument("--compare", action='store', dest="compare", default=None,
+                        help="commit, branch or results file to compare with")
+    parser.add_argument("--results", action='store', dest="results", default=RESULTS_PATH,
+                        help="folder of the results, benchmarks/results by default (ignored by git)")
+
+    main(parser.parse_args())
@@ -1,7 +1,7 @@
 import os.path, re, datetime, logging
 from pyquery import PyQuery as pq
-from src.download import open_or_download, sanity_check
-from models.basemodel import BaseModel
+from src.download import SESSION, read_content, is_stored, pending_downloads, download_many, sanity_check
+from models.basemodel import DATABASE, BaseModel, SQLITE_MAX_VARIABLES, insert_many_batched, update_many
 from peewee import (PrimaryKeyField, TextField,
                     DoubleField, DateTimeField, BooleanField)
 
@@ -29,77 +29,132 @@ class Actor(BaseModel):
     twitter = TextField(null=True)
 
     @staticmethod
-    def save_actors(logging_level=logging.INFO):
+    def get_page(acbid, is_coach):
         from src.season import BASE_URL, PLAYERS_PATH, COACHES_PATH
+        """
+        Get the local file and the url of the page of an actor.
+
+        :param acbid: String
+        :param is_coach: bool
+        :return: (file_path, url) tuple
+        """
+        folder = COACHES_PATH if is_coach else PLAYERS_PATH
+        url_tag = 'entrenador' if is_coach else 'jugador'
+        return os.path.join(folder, acbid + '.html'), os.path.join(BASE_URL, '{}.php?id={}'.format(url_tag, acbid))
+
+    @staticmethod
+    def save_actors(workers=1, logging_level=logging.INFO):
         """
         Method for saving locally the actors.
 
+        :param workers: int, number of concurrent downloads.
         :param logging_level: logging object
         """
         logging.basicConfig(level=logging_level)
         logger = logging.getLogger(__name__)
 
         logger.info('Starting the download of actors...')
-        actors = Actor.select()
-        for cont, actor in enumerate(actors):
-            folder = COACHES_PATH if actor.is_coach else PLAYERS_PATH
-            url_tag = 'entrenador' if actor.is_coach else 'jugador'
-
-            filename = os.path.join(folder, actor.acbid + '.html')
-            url = os.path.join(BASE_URL, '{}.php?id={}'.format(url_tag, actor.acbid))
-            open_or_download(file_path=filename, url=url)
+        downloads = dict(Actor.get_page(actor.acbid, actor.is_coach)
+                         for actor in Actor.select(Actor.acbid, Actor.is_coach))
 
-            if cont % (round(len(actors) / 3)) == 0:
-                logger.info('{}% already downloaded'.format(round(float(cont) / len(actors) * 100)))
+        pending = pending_downloads(list(downloads))  # missing or broken pages, according to the manifest.
+        n_pending = len(pending)
+        # The pages already stored are requested with their validators when they are being revalidated.
+        for cont, filename in enumerate(download_many([(filename, downloads[filename]) for filename in pending],
+                                                      workers=workers, force=not SESSION.revalidate)):
+            if cont % (round(n_pending / 3) or 1) == 0:
+                logger.info('{}% already downloaded'.format(round(float(cont) / n_pending * 100)))
 
         logger.info('Downloading finished!\n')
 
     @staticmethod
-    def sanity_check(logging_level=logging.INFO):
-        from src.season import BASE_URL, PLAYERS_PATH, COACHES_PATH
-        sanity_check(PLAYERS_PATH, logging_level)
-        sanity_check(COACHES_PATH, logging_level)
+    def sanity_check(logging_level=logging.INFO, verify=False, repair=False):
+        from src.season import PLAYERS_PATH, COACHES_PATH
+        return [sanity_check(PLAYERS_PATH, logging_level, verify=verify, repair=repair),
+                sanity_check(COACHES_PATH, logging_level, verify=verify, repair=repair)]
 
     @staticmethod
-    def update_content(logging_level=logging.INFO):
+    def get_ids(actors):
+        """
+        Get the ids in the database of some actors, creating the ones that don't exist yet with a single insert.
+
+        :param actors: list of dicts with the acbid, display_name and is_coach of the actors. If an actor appears
+        several times, it is created with its first appearance.
+        :return: dict {acbid: id}
+        """
+        acbids = list(dict.fromkeys(actor['acbid'] for actor in actors))
+
+        def select_ids():
+            ids = dict()
+            for start in range(0, len(acbids), SQLITE_MAX_VARIABLES):
+                query = (Actor.select(Actor.id, Actor.acbid)
+                         .where(Actor.acbid << acbids[start:start + SQLITE_MAX_VARIABLES])
+                         .order_by(Actor.id))
+                for actor in query:
+                    ids.setdefault(actor.acbid, actor.id)  # acb has a few duplicated actors, we take the first one.
+            return ids
+
+        ids = select_ids()
+        new_actors = dict()
+        for actor in actors:
+            if actor['acbid'] not in ids and actor['acbid'] not in new_actors:
+                new_actors[actor['acbid']] = actor
+        if new_actors:
+            insert_many_batched(Actor, list(new_actors.values()))
+            ids = select_ids()
+        return ids
+
+    @staticmethod
+    def update_content(workers=1, logging_level=logging.INFO):
         """
         First we insert the instances in the database with basic information and later we update the rest of fields.
         We update the information of the actors that have not been filled yet in the database.
+
+        The pages of the actors are fetched by `workers` threads and parsed by `workers` processes, and all the actors
+        are updated with a few executemany statements.
+
+        :param workers: int
+        :param logging_level: logging object
         """
+        from src.ingest import parse_files  # src.ingest imports the models.
         logging.basicConfig(level=logging_level)
         logger = logging.getLogger(__name__)
 
         logger.info('Starting to update the actors that have not been filled yet...')
-        actors = Actor.select().where(Actor.full_name >> None)
-        for cont, actor in enumerate(actors):
-            actor._update_content()
-            try:
-                if len(actors) and cont % (round(len(actors) / 3)) == 0:
-                    logger.info( '{}% already updated'.format(round(float(cont) / len(actors) * 100)))
-            except ZeroDivisionError:
-                pass
-
-        logger.info('Update finished! ({} actors)\n'.format(len(actors)))
-
-    def _update_content(self):
-        from src.season import BASE_URL, PLAYERS_PATH, COACHES_PATH
-        """
-        Update the information of a particular actor.
-        """
-        folder = COACHES_PATH if self.is_coach else PLAYERS_PATH
-        url_tag = 'entrenador' if self.is_coach else 'jugador'
+        pages = {actor.acbid: Actor.get_page(actor.acbid, actor.is_coach)
+                 for actor in Actor.select(Actor.acbid, Actor.is_coach).where(Actor.full_name >> None)}
+
+        # Only the missing pages are downloaded, and all of them if they are being revalidated.
+        list(download_many([(filename, url) for filename, url in pages.values()
+                            if SESSION.revalidate or not is_stored(filename)], workers=workers))
+
+        # Parsed before the transaction, the processes must not inherit it.
+        acbids = [acbid for acbid, (filename, _) in pages.items() if is_stored(filename)]
+        personal_infos = parse_files(Actor.parse_page, [pages[acbid][0] for acbid in acbids], workers=workers)
+
+        with DATABASE.atomic():
+            update_many(Actor, 'acbid', [dict(personal_info, acbid=acbid)
+                                         for acbid, personal_info in zip(acbids, personal_infos)])
+
+        logger.info('Update finished! ({} actors)\n'.format(len(acbids)))
 
-        filename = os.path.join(folder, self.acbid + '.html')
-        url = os.path.join(BASE_URL, '{}.php?id={}'.format(url_tag, self.acbid))
-        content = open_or_download(file_path=filename, url=url)
+    @staticmethod
+    def parse_page(file_path):
+        """
+        Extract the information of an actor from its page.
 
-        personal_info = self._get_personal_info(content)
-        twitter = self._get_twitter(content)
+        :param file_path: String
+        :return: dict with the info.
+        """
+        content = read_content(file_path)
+        personal_info = Actor._get_personal_info(content)
+        twitter = Actor._get_twitter(content)
         if twitter:
             personal_info.update({'twitter': twitter})
-        Actor.update(**personal_info).where(Actor.acbid == self.acbid).execute()
+        return personal_info
 
-    def _get_personal_info(self, raw_doc):
+    @staticmethod
+    def _get_personal_info(raw_doc):
         """
         Get personal information about an actor
         :param raw_doc: String
@@ -151,7 +206,8 @@ class Actor(BaseModel):
 
         return personal_info
 
-    def _get_twitter(self, raw_doc):
+    @staticmethod
+    def _get_twitter(raw_doc):
         """
         Get the twitter of an actor, if it exists.
         :param raw_doc: String
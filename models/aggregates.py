@@ -0,0 +1,153 @@
+"""
+Materialized aggregates of the participants (see the end of schema.sql), so that the season and career totals don't
+need a GROUP BY over the whole participant table. They are refreshed by season: the rows of the seasons that were
+inserted are computed again, and so are the careers of the players that appear in them.
+"""
+import logging
+from models.basemodel import DATABASE
+from src.constants import get_acbid_range
+
+STATS = ['minutes', 'point', 't2_attempt', 't2', 't3_attempt', 't3', 't1_attempt', 't1', 'defensive_reb',
+         'offensive_reb', 'assist', 'steal', 'turnover', 'counterattack', 'block', 'received_block', 'dunk', 'fault',
+         'received_fault', 'plus_minus', 'efficiency']
+PERCENTAGES = {'t2_pct': ('t2', 't2_attempt'), 't3_pct': ('t3', 't3_attempt'), 't1_pct': ('t1', 't1_attempt')}
+LEADERBOARD_TABLES = ['playerSeason', 'teamSeason']
+
+
+def _sums(prefix=''):
+    return ', '.join('SUM({0}{1}) AS {1}'.format(prefix, stat) for stat in STATS)
+
+
+def _percentages():
+    return ', '.join('CAST(SUM({}) AS REAL) / NULLIF(SUM({}), 0)'.format(scored, attempts)
+                     for scored, attempts in PERCENTAGES.values())
+
+
+def _season_games(season):
+    """
+    The games of a season.
+
+    :param season: int
+    :return: (String, tuple) with the condition on the game table `g` and its parameters.
+    """
+    return 'g.acbid BETWEEN ? AND ?', get_acbid_range(season)
+
+
+def refresh_season(season):
+    """
+    Compute again the aggregates of a season: playerSeason, teamSeasonOpponent and teamSeason.
+
+    :param season: int
+    """
+    condition, parameters = _season_games(season)
+    columns = ', '.join(STATS + list(PERCENTAGES))
+
+    for table in ['playerSeason', 'teamSeasonOpponent', 'teamSeason']:
+        DATABASE.execute_sql('DELETE FROM {} WHERE season = ?'.format(table), (season,))
+
+    DATABASE.execute_sql(
+        'INSERT INTO playerSeason (actor_id, season, games, games_started, {}) '
+        'SELECT p.actor_id, ?, COUNT(*), SUM(p.is_starter), {}, {} '
+        'FROM game g JOIN participant p ON p.game_id = g.id '
+        'WHERE {} AND p.actor_id IS NOT NULL AND NOT p.is_coach AND NOT p.is_referee '
+        'GROUP BY p.actor_id'.format(columns, _sums('p.'), _percentages(), condition),
+        (season,) + parameters)
+
+    # The games from the point of view of each team, with the stats of its participants.
+    DATABASE.execute_sql(
+        'INSERT INTO teamSeasonOpponent (team_id, season, opponent_id, games, wins, losses, points_for, '
+        'points_against, {0}) '
+        'WITH team_games AS ('
+        '    SELECT g.id AS game_id, g.team_home_id AS team_id, g.team_away_id AS opponent_id, '
+        '           g.score_home AS points_for, g.score_away AS points_against FROM game g WHERE {1} '
+        '    UNION ALL '
+        '    SELECT g.id, g.team_away_id, g.team_home_id, g.score_away, g.score_home FROM game g WHERE {1}), '
+        'team_stats AS ('
+        '    SELECT p.game_id, p.team_id, {2} FROM team_games t JOIN participant p '
+        '    ON p.game_id = t.game_id AND p.team_id = t.team_id '
+        '    WHERE NOT p.is_coach AND NOT p.is_referee GROUP BY p.game_id, p.team_id) '
+        'SELECT t.team_id, ?, t.opponent_id, COUNT(*), SUM(t.points_for > t.points_against), '
+        '       SUM(t.points_for < t.points_against), SUM(t.points_for), SUM(t.points_against), {3}, {4} '
+        'FROM team_games t LEFT JOIN team_stats s ON s.game_id = t.game_id AND s.team_id = t.team_id '
+        'WHERE t.team_id IS NOT NULL AND t.opponent_id IS NOT NULL '
+        'GROUP BY t.team_id, t.opponent_id'.format(columns, condition, _sums('p.'), _sums('s.'), _percentages()),
+        parameters + parameters + (season,))
+
+    DATABASE.execute_sql(
+        'INSERT INTO teamSeason (team_id, season, games, wins, losses, points_for, points_against, {}) '
+        'SELECT team_id, season, SUM(games), SUM(wins), SUM(losses), SUM(points_for), SUM(points_against), {}, {} '
+        'FROM teamSeasonOpponent WHERE season = ? GROUP BY team_id'.format(columns, _sums(), _percentages()),
+        (season,))
+
+
+def refresh_careers(actors_query, parameters=()):
+    """
+    Compute again the careers of some players from their seasons.
+
+    :param actors_query: String, SELECT of the actor ids.
+    :param parameters: tuple, parameters of actors_query.
+    """
+    columns = ', '.join(STATS + list(PERCENTAGES))
+    DATABASE.execute_sql('DELETE FROM playerCareer WHERE actor_id IN ({})'.format(actors_query), parameters)
+    DATABASE.execute_sql(
+        'INSERT INTO playerCareer (actor_id, seasons, first_season, last_season, games, games_started, {}) '
+        'SELECT actor_id, COUNT(*), MIN(season), MAX(season), SUM(games), SUM(games_started), {}, {} '
+        'FROM playerSeason WHERE actor_id IN ({}) GROUP BY actor_id'.format(columns, _sums(), _percentages(),
+                                                                             actors_query),
+        parameters)
+
+
+def refresh_aggregates(seasons, logging_level=logging.INFO):
+    """
+    Refresh the aggregates of some seasons and the careers of the players that played in them, before or after the
+    refresh, in a single transaction.
+
+    :param seasons: iterable of int
+    :param logging_level: logging object
+    """
+    logging.basicConfig(level=logging_level)
+    logger = logging.getLogger(__name__)
+
+    seasons = sorted(set(seasons))
+    if not seasons:
+        return
+    logger.info('Refreshing the aggregates of {} seasons...'.format(len(seasons)))
+
+    placeholders = ', '.join('?' for _ in seasons)
+    with DATABASE.atomic():
+        DATABASE.execute_sql('DROP TABLE IF EXISTS temp.touched_actors')
+        DATABASE.execute_sql('CREATE TEMP TABLE touched_actors (actor_id INTEGER PRIMARY KEY)')
+        touched_query = ('INSERT OR IGNORE INTO temp.touched_actors '
+                         'SELECT actor_id FROM playerSeason WHERE season IN ({})'.format(placeholders))
+
+        DATABASE.execute_sql(touched_query, seasons)  # e.g. an actor that has been merged into another one.
+        for season in seasons:
+            refresh_season(season)
+        DATABASE.execute_sql(touched_query, seasons)
+
+        refresh_careers('SELECT actor_id FROM temp.touched_actors')
+        DATABASE.execute_sql('DROP TABLE temp.touched_actors')
+
+    logger.info('Aggregates refreshed!')
+
+
+def get_leaderboard(season, stat, table='playerSeason', per_game=False, limit=10):
+    """
+    Get the best players (or teams) of a season in a stat, from the aggregates.
+
+    :param season: int
+    :param stat: String, a stat of STATS or a percentage, e.g. 'point' or 't3_pct'.
+    :param table: String, 'playerSeason' or 'teamSeason'.
+    :param per_game: bool, rank by the average per game instead of the total. Percentages are never divided.
+    :param limit: int
+    :return: list of (actor_id or team_id, games, value) tuples.
+    """
+    if table not in LEADERBOARD_TABLES:
+        raise ValueError('Unknown table {}, expected one of {}'.format(table, LEADERBOARD_TABLES))
+    if stat not in STATS and stat not in PERCENTAGES:
+        raise ValueError('Unknown stat {}'.format(stat))
+
+    key = 'actor_id' if table == 'playerSeason' else 'team_id'
+    value = 'CAST({} AS REAL) / games'.format(stat) if per_game and stat in STATS else stat
+    return DATABASE.execute_sql('SELECT {0}, games, {1} AS value FROM {2} WHERE season = ? AND value IS NOT NULL '
+                                'ORDER BY value DESC, {0} LIMIT ?'.format(key, value, table), (season, limit)).fetchall()
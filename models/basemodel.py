@@ -1,4 +1,5 @@
-import os.path
+import os.path, re, sqlite3, contextlib, logging
+from collections import defaultdict
 from peewee import (Model, SqliteDatabase, Proxy)
 
 
@@ -6,27 +7,176 @@ DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
                                        '..', 'data', 'database.db'))
 SCHEMA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
                                            'schema.sql'))
+# Maximum number of parameters of a statement in SQLite.
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+"""
+The indexes of the big tables are created after a bulk load, which is much faster than updating them row by row.
+"""
+DEFERRED_INDEX_RE = re.compile(r'^CREATE INDEX \w+ ON (?:game|participant|actor)\(.*?\);[ \t]*$', re.MULTILINE)
+BULK_LOAD_PRAGMAS = ['PRAGMA journal_mode = WAL',
+                     'PRAGMA synchronous = OFF',  # a bulk load can be repeated from the pages if the machine crashes.
+                     'PRAGMA cache_size = -262144',  # 256MB
+                     'PRAGMA temp_store = MEMORY']
+SAFE_PRAGMAS = ['PRAGMA journal_mode = DELETE',
+                'PRAGMA synchronous = FULL',
+                'PRAGMA cache_size = -2000',
+                'PRAGMA temp_store = DEFAULT']
+# Indexes of previous versions of the schema that are prefixes of the composite ones, e.g. participant(actor_id).
+REPLACED_INDEXES = ['game_team_home_id_idx', 'game_team_away_id_idx', 'participant_actor_id_idx']
 DB_PROXY = Proxy()
 DATABASE = SqliteDatabase(DB_PATH)
 DB_PROXY.initialize(DATABASE)
 
 
-def reset_database():
+def reset_database(defer_indexes=False, db_path=None):
+    """
+    Create an empty database from the schema.
+
+    :param defer_indexes: bool, don't create the indexes of the games, participants and actors yet. They are created
+    by create_deferred_indexes, e.g. at the end of bulk_load.
+    :param db_path: String, path of the database. DB_PATH by default.
+    """
+    db_path = db_path or DB_PATH
     try:
         DATABASE.close()
     except:
         pass
-    try:
-        os.remove(DB_PATH)
-    except FileNotFoundError:
-        pass
+    for path in [db_path, db_path + '-wal', db_path + '-shm']:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
     with open(SCHEMA_PATH) as f:
         query = f.read()
-    DATABASE.init(DB_PATH)
+    if defer_indexes:
+        query = DEFERRED_INDEX_RE.sub('', query)
+    DATABASE.init(db_path)
     DATABASE.connect()
     DATABASE.get_cursor().executescript(query)
 
 
+def create_deferred_indexes():
+    """
+    Create the indexes of the games, participants and actors, if they don't exist.
+    """
+    with open(SCHEMA_PATH) as f:
+        statements = DEFERRED_INDEX_RE.findall(f.read())
+    for statement in statements:
+        DATABASE.execute_sql(statement.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1))
+
+
+def migrate_database():
+    """
+    Bring a database created by a previous version of the schema up to date: the tables and indexes that don't exist
+    are created, the columns that are missing are added (e.g. game.page_sha1) and the REPLACED_INDEXES are dropped.
+    It can be run on every start, a database that is up to date is not modified.
+    """
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    expected = sqlite3.connect(':memory:')
+    expected.executescript(schema)
+
+    with DATABASE.atomic():
+        tables = {row[0] for row in DATABASE.execute_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table, sql in expected.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall():
+            if table not in tables:
+                DATABASE.execute_sql(sql)
+                continue
+            columns = {row[1] for row in DATABASE.execute_sql('PRAGMA table_info({})'.format(table))}
+            for _, column, declared_type, _, _, _ in expected.execute('PRAGMA table_info({})'.format(table)):
+                if column not in columns:
+                    DATABASE.execute_sql('ALTER TABLE {} ADD COLUMN {} {}'.format(table, column, declared_type))
+
+        for sql, in expected.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"):
+            DATABASE.execute_sql(sql.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1))
+        for index in REPLACED_INDEXES:
+            DATABASE.execute_sql('DROP INDEX IF EXISTS {}'.format(index))
+    expected.close()
+
+
+@contextlib.contextmanager
+def bulk_load(logging_level=logging.INFO):
+    """
+    Profile for loading many rows in the database: WAL journal, no syncs, a big page cache and temporary tables in
+    memory. At the end, the deferred indexes are created, the statistics of the query planner are updated and the
+    safe settings are restored.
+
+    :param logging_level: logging object
+    """
+    logging.basicConfig(level=logging_level)
+    logger = logging.getLogger(__name__)
+
+    for pragma in BULK_LOAD_PRAGMAS:
+        DATABASE.execute_sql(pragma)
+    try:
+        yield
+        logger.info('Creating the indexes...')
+        create_deferred_indexes()
+        DATABASE.execute_sql('ANALYZE')
+    finally:
+        for pragma in SAFE_PRAGMAS:
+            DATABASE.execute_sql(pragma)
+
+
+def insert_many_batched(model, rows):
+    """
+    Insert many rows with as few statements as SQLite allows. The rows might have different fields (e.g. the +/- stat
+    is not in the old games), the missing ones are inserted as NULL.
+
+    :param model: BaseModel class
+    :param rows: list of dicts
+    """
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    if not columns:
+        return
+    batch_size = max(1, SQLITE_MAX_VARIABLES // len(columns))
+    for start in range(0, len(rows), batch_size):
+        model.insert_many([{column: row.get(column) for column in columns}
+                           for row in rows[start:start + batch_size]]).execute()
+
+
+def insert_rows(model, fields, rows):
+    """
+    Insert many rows given as tuples with a single executemany statement, without building dicts nor model
+    instances. The values must already be the ones stored in the database, e.g. the ids of the foreign keys.
+
+    :param model: BaseModel class
+    :param fields: list of Strings, the fields of the model in the order of the values of the rows.
+    :param rows: list of tuples
+    """
+    if not rows:
+        return
+    columns = [model._meta.fields[field].db_column for field in fields]
+    DATABASE.get_cursor().executemany('INSERT INTO {} ({}) VALUES ({})'.format(
+        model._meta.db_table, ', '.join(columns), ', '.join('?' for _ in columns)), rows)
+
+
+def update_many(model, key, rows):
+    """
+    Update many rows with one executemany statement per set of fields, instead of one UPDATE per row. The values are
+    converted as peewee does.
+
+    :param model: BaseModel class
+    :param key: String, field that identifies the rows, e.g. 'acbid'.
+    :param rows: list of dicts with the key and the fields to update.
+    """
+    fields = model._meta.fields
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(column for column in row if column != key)].append(row)
+
+    cursor = DATABASE.get_cursor()
+    for columns, group in groups.items():
+        if not columns:
+            continue
+        query = 'UPDATE {} SET {} WHERE {} = ?'.format(model._meta.db_table,
+                                                       ', '.join('{} = ?'.format(fields[column].db_column)
+                                                                 for column in columns),
+                                                       fields[key].db_column)
+        cursor.executemany(query, [[fields[column].db_value(row[column]) for column in columns] +
+                                   [fields[key].db_value(row[key])] for row in group])
+
+
 class BaseModel(Model):
     class Meta:
         database = DB_PROXY
\ No newline at end of file
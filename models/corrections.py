@@ -0,0 +1,75 @@
+"""
+acb.com has a few errors that are corrected after the games are inserted. They are listed in corrections.json:
+
+- acbid_rewrites: actors whose acbid is wrong, identified by their display name.
+- actor_merges: players that acb has created twice. The participations of the wrong actor are moved to the actual
+  one, and the wrong actor is deleted.
+- duplicated_numbers: games whose page has two players with the same number, and which of both rows is the good one
+  ('keep_first' or 'keep_second').
+"""
+import os.path, json
+from models.basemodel import DATABASE
+from src.constants import FIRST_SEASON
+
+CORRECTIONS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), 'corrections.json'))
+CORRECTIONS_VERSION = 1
+DUPLICATED_NUMBERS_POLICIES = ['keep_first', 'keep_second']
+
+
+def load_corrections(path=CORRECTIONS_PATH):
+    """
+    Read and validate a file of corrections.
+
+    :param path: String
+    :return: dict
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        corrections = json.load(file)
+
+    if corrections.get('version') != CORRECTIONS_VERSION:
+        raise ValueError('{} has version {}, expected {}'.format(path, corrections.get('version'),
+                                                                 CORRECTIONS_VERSION))
+    for acbid, policy in corrections['duplicated_numbers'].items():
+        if policy not in DUPLICATED_NUMBERS_POLICIES:
+            raise ValueError('Unknown policy {} for the game {} in {}'.format(policy, acbid, path))
+    return corrections
+
+
+CORRECTIONS = load_corrections()
+
+
+def apply_corrections(corrections=CORRECTIONS):
+    """
+    Apply the corrections of the actors in a single transaction. Each correction is a fixed number of statements,
+    no matter how many participations it affects.
+
+    :param corrections: dict, as returned by load_corrections.
+    :return: list of int, the seasons of the participations moved to another actor, whose aggregates have to be
+    refreshed.
+    """
+    seasons = set()
+    with DATABASE.atomic():
+        for rewrite in corrections['acbid_rewrites']:
+            DATABASE.execute_sql('UPDATE actor SET acbid = ? '
+                                 'WHERE id = (SELECT MIN(id) FROM actor WHERE display_name = ?)',
+                                 (rewrite['acbid'], rewrite['display_name']))
+
+        for merge in corrections['actor_merges']:
+            actual = (merge['display_name'], merge['acbid'])
+            wrong = (merge['display_name'], merge['wrong_acbid'])
+            # Nothing is done if the actual actor is not in the database, e.g. only a few seasons were inserted.
+            seasons.update(row[0] for row in DATABASE.execute_sql(
+                'SELECT DISTINCT CAST(substr(g.acbid, 1, 2) AS INTEGER) + ? '
+                'FROM participant p JOIN game g ON g.id = p.game_id '
+                'WHERE p.actor_id IN (SELECT id FROM actor WHERE display_name = ? AND acbid = ?) '
+                'AND EXISTS (SELECT 1 FROM actor WHERE display_name = ? AND acbid = ?)',
+                (FIRST_SEASON - 1,) + wrong + actual))
+            DATABASE.execute_sql('UPDATE participant '
+                                 'SET actor_id = (SELECT MIN(id) FROM actor WHERE display_name = ? AND acbid = ?) '
+                                 'WHERE actor_id IN (SELECT id FROM actor WHERE display_name = ? AND acbid = ?) '
+                                 'AND EXISTS (SELECT 1 FROM actor WHERE display_name = ? AND acbid = ?)',
+                                 actual + wrong + actual)
+            DATABASE.execute_sql('DELETE FROM actor WHERE display_name = ? AND acbid = ? '
+                                 'AND EXISTS (SELECT 1 FROM actor WHERE display_name = ? AND acbid = ?)',
+                                 wrong + actual)
+    return sorted(seasons)
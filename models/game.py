@@ -1,9 +1,9 @@
-import os.path, re, datetime, difflib, logging
-from pyquery import PyQuery as pq
-from src.download import open_or_download, sanity_check
-from src.season import BASE_URL
-from models.basemodel import BaseModel
-from models.team import Team, TeamName
+import os.path, datetime, logging
+from src.download import SESSION, download_many, pending_downloads, sanity_check
+from src.records import GameRow, GAME_FIELDS
+from src.constants import get_acbid
+from models.basemodel import BaseModel, insert_rows, update_many
+from models.team import Team, TeamResolver
 from peewee import (PrimaryKeyField, TextField, IntegerField,
                     DateTimeField, ForeignKeyField, BooleanField)
 
@@ -37,179 +37,191 @@ class Game(BaseModel):
     score_home_extra = IntegerField(null=True)
     score_away_extra = IntegerField(null=True)
     db_flag = BooleanField(null=True)
+    page_sha1 = TextField(null=True)
 
     @staticmethod
-    def save_games(season, logging_level=logging.INFO):
+    def save_games(season, workers=1, logging_level=logging.INFO):
         """
         Method for saving locally the games of a season.
 
+        The manifest tells which games are missing or broken, and only those are fetched (all of them if the pages are
+        being revalidated). They are downloaded concurrently by a pool of `workers` threads, since most of the time is
+        spent waiting for acb.com.
+
         :param season: int
+        :param workers: int
         :param logging_level: logging object
         :return:
         """
+        from src.season import BASE_URL
         logging.basicConfig(level=logging_level)
         logger = logging.getLogger(__name__)
 
         logger.info('Starting downloading...')
         n_games = season.get_number_games()
+        downloads = dict()
         for game_id in range(1, n_games + 1):
             filename = os.path.join(season.GAMES_PATH, str(game_id) + '.html')
             url = BASE_URL + "stspartido.php?cod_competicion=LACB&cod_edicion={}&partido={}".format(season.season_id,
                                                                                                     game_id)
-            open_or_download(file_path=filename, url=url)
-            if game_id % (round(n_games / 3)) == 0:
-                logger.info('{}% already downloaded'.format(round(float(game_id) / n_games * 100)))
+            downloads[filename] = url
+        downloads = [(filename, downloads[filename]) for filename in pending_downloads(list(downloads))]
+
+        # The pages already stored are requested with their validators when they are being revalidated.
+        n_downloads = len(downloads)
+        for cont, filename in enumerate(download_many(downloads, workers=workers, force=not SESSION.revalidate),
+                                        start=1):
+            if cont % (round(n_downloads / 3) or 1) == 0:
+                logger.info('{}% already downloaded'.format(round(float(cont) / n_downloads * 100)))
 
-        logger.info('Downloading finished! (new {} games in {})'.format(n_games, season.GAMES_PATH))
+        logger.info('Downloading finished! (new {} games in {})'.format(n_downloads, season.GAMES_PATH))
 
     @staticmethod
-    def sanity_check(season, logging_level=logging.INFO):
-        sanity_check(season.GAMES_PATH, logging_level)
+    def sanity_check(season, logging_level=logging.INFO, verify=False, repair=False):
+        return sanity_check(season.GAMES_PATH, logging_level, verify=verify, repair=repair)
 
     @staticmethod
-    def create_instance(raw_game, id_game_number, season, competition_phase='regular', round_phase=None):
+    def get_ingested(season):
         """
-        Extract all the information regarding the game such as the date, attendance, venue, score per quarter or teams.
-        Therefore, we need first to extract and insert the teams in the database in order to get the references to the db.
+        Get the games of a season that are already in the database.
 
-        :param raw_game: String
-        :param id_game_number: int
         :param season: Season
-        :param competition_phase: String
-        :param round_phase: String
-        :return: Game object
-        """
-
-        logging.basicConfig(level=logging.INFO)
-        logger = logging.getLogger(__name__)
-
-        """
-        There are two different statistics table in acb.com.
-        I assume they created the new one to introduce the +/- stat.
+        :return: dict {acbid: Game object with its id, page_sha1 and competition_phase}
         """
-        estadisticas_tag = '.estadisticasnew' if re.search(r'<table class="estadisticasnew"',
-                                                           raw_game) else '.estadisticas'
-
-        doc = pq(raw_game)
-        game_dict = dict()
+        acbids = [Game.get_acbid(season, id_game_number) for id_game_number in range(1, season.get_number_games() + 1)]
+        query = Game.select(Game.id, Game.acbid, Game.page_sha1, Game.competition_phase).where(Game.acbid << acbids)
+        return {game.acbid: game for game in query}
 
+    @staticmethod
+    def get_acbid(season, id_game_number):
         """
         Each game has an unique id in acb.com. The id has 5 digits, where the first two digits are the season code (the
-        oldest season in 1956 has code 1) and the three last are the number of the game (a simple counter since the beginning
-        of the season).
+        oldest season in 1956 has code 1) and the three last are the number of the game (a simple counter since the
+        beginning of the season), see src.constants.
 
         This id can be used to access the concrete game within the link 'http://www.acb.com/fichas/LACBXXYYY.php'
-        """
-        game_dict['acbid'] = str(season.season_id).zfill(2) + str(id_game_number).zfill(3)
-        game_dict['competition_phase'] = competition_phase
-        game_dict['round_phase'] = round_phase
 
-        # Information about the teams.
-        info_teams_data = doc(estadisticas_tag).eq(1)
-        home_team_name = None
-        away_team_name = None
+        :param season: Season
+        :param id_game_number: int
+        :return: String
+        """
+        return get_acbid(season.season, id_game_number)
 
+    @staticmethod
+    def create_instance(game_page, id_game_number, season, competition_phase='regular', round_phase=None):
         """
-        We only have the names of the teams (text) within the doc. Hence, we need to get the teams' ids from other
-        source in order to introduce such information in the database.
+        Extract all the information regarding the game such as the date, attendance, venue, score per quarter or teams.
+        Therefore, we need first to extract and insert the teams in the database in order to get the references to the db.
 
-        Full disclosure: we get these ids from the standing page. If we the standing page is not available (it might
-        happensin old seasons), we try to make a match with existing teams. If this match doesn't exist, we need to
-        harcode the team and its id correspondance.
+        :param game_page: GamePage
+        :param id_game_number: int
+        :param season: Season
+        :param competition_phase: String
+        :param round_phase: String
+        :return: GameRow, with its id in the database.
         """
-        teams_ids = season.get_teams_ids()
-        for i in [0, 2]:
-            team_data = info_teams_data('.estverde').eq(i)('td').eq(0).text()
-            team_name = re.search("(.*) [0-9]", team_data).groups()[0]
-            """
-            We create a team per season since a team can have different names along its history. Anyway, same teams
-            will have same acbid.
+        game = Game.extract_data(game_page, Game.get_acbid(season, id_game_number), competition_phase, round_phase)
+        Game.resolve_teams(game, game_page.team_names, TeamResolver(season))
+        Game.create_many([game])
+        return game
 
-            Note: ACB doesn't agree in teams names and sometimes write the same name in different ways.
-            E.g.:
+    @staticmethod
+    def extract_data(game_page, acbid, competition_phase='regular', round_phase=None):
+        """
+        Extract the information of the game that doesn't depend on the database: the date, attendance, venue and score
+        per quarter.
 
-             - VALENCIA BASKET instead of VALENCIA BASKET CLUB
-             - C.B. OURENSE instead of CB OURENSE
-            """
-            try:
-                if len(teams_ids):  # if the standing page exists.
-                    team_acbid = teams_ids[team_name]
-                else:
-                    team_acbid = TeamName.get(TeamName.name == team_name).team.acbid
-                team = Team.get(Team.acbid == team_acbid)
-
-            except KeyError:  # we don't find an exact correspondance, let's find the closest match.
-                if season.season in list(Team.get_harcoded_teams().keys()) \
-                        and team_name in list(Team.get_harcoded_teams()[season.season].keys()):  # harcoded team?
-                    team = Team.get(Team.acbid == Team.get_harcoded_teams()[season.season][team_name])
-                else:
-                    most_likely_team = difflib.get_close_matches(team_name, teams_ids.keys(), 1, 0.4)[0]
-                    team = Team.get(Team.acbid == teams_ids[most_likely_team])
-
-                    if most_likely_team not in season.mismatched_teams:  # debug info to check the correctness.
-                        season.mismatched_teams.append(most_likely_team)
-                        logger.info('Season {} -> {} has been matched to: {}'.format(season.season,
-                                                                                     team_name,
-                                                                                     most_likely_team))
-
-            TeamName.get_or_create(**{'team': team, 'name': team_name, 'season': season.season})
-            game_dict['team_home_id' if i == 0 else 'team_away_id'] = team
-            home_team_name = team_name if i == 0 else home_team_name
-            away_team_name = team_name if i != 0 else away_team_name
+        :param game_page: GamePage
+        :param acbid: String
+        :param competition_phase: String
+        :param round_phase: String
+        :return: GameRow, without the teams.
+        """
+        game = GameRow(acbid=acbid, competition_phase=competition_phase, round_phase=round_phase)
 
         # Information about the game.
-        info_game_data = doc(estadisticas_tag).eq(0)
-
-        scheduling_data = info_game_data('.estnegro')('td').eq(0).text()
-        scheduling_data = scheduling_data.split("|")
-        journey, date, time, venue, attendance = list(map(lambda x: x.strip(), scheduling_data))  # Remove extra spaces.
+        journey, date, time, venue, attendance = game_page.schedule
 
         if date and time:
             day, month, year = list(map(int, date.split("/")))
             hour, minute = list(map(int, time.split(":")))
-            game_dict['kickoff_time'] = datetime.datetime(year=year, month=month, day=day, hour=hour, minute=minute)
+            game.kickoff_time = datetime.datetime(year=year, month=month, day=day, hour=hour, minute=minute)
 
         if attendance:
             try:
-                game_dict['attendance'] = int(attendance.split(":")[1])
+                game.attendance = int(attendance.split(":")[1])
             except ValueError:
                 pass
 
         if venue:
-            game_dict['venue'] = venue
+            game.venue = venue
 
         if journey:
-            game_dict['journey'] = journey.split(" ")[1]
-
-        for i in range(2, 7):
-            score_home_attribute = ''
-            score_away_attribute = ''
-            if i == 2:
-                score_home_attribute = 'score_home_first'
-                score_away_attribute = 'score_away_first'
-            elif i == 3:
-                score_home_attribute = 'score_home_second'
-                score_away_attribute = 'score_away_second'
-            elif i == 4:
-                score_home_attribute = 'score_home_third'
-                score_away_attribute = 'score_away_third'
-            elif i == 5:
-                score_home_attribute = 'score_home_fourth'
-                score_away_attribute = 'score_away_fourth'
-            elif i == 6:
-                score_home_attribute = 'score_home_extra'
-                score_away_attribute = 'score_away_extra'
-
-            quarter_data = info_game_data('.estnaranja')('td').eq(i).text()
+            game.journey = journey.split(" ")[1]
+
+        for quarter, quarter_data in zip(['first', 'second', 'third', 'fourth', 'extra'], game_page.quarter_scores):
+            score_home_attribute = 'score_home_' + quarter
+            score_away_attribute = 'score_away_' + quarter
+
             if quarter_data:
                 try:
-                    game_dict[score_home_attribute], game_dict[score_away_attribute] = list(
-                        map(int, quarter_data.split("|")))
+                    game[score_home_attribute], game[score_away_attribute] = list(map(int, quarter_data.split("|")))
                 except ValueError:
                     pass
 
-        try:
-            game = Game.get(Game.acbid == game_dict['acbid'])
-        except:
-            game = Game.create(**game_dict)
-        return game
\ No newline at end of file
+        return game
+
+    @staticmethod
+    def resolve_teams(game, team_names, teams):
+        """
+        Resolve the teams of a game in the database, in memory.
+
+        :param game: GameRow, its team ids are set.
+        :param team_names: list with the names of the home and away teams.
+        :param teams: TeamResolver of the season.
+        :return: the Team objects of the home and away teams.
+        """
+
+        # Information about the teams.
+        """
+        We only have the names of the teams (text) within the doc. Hence, we need to get the teams' ids from other
+        source in order to introduce such information in the database.
+
+        Full disclosure: we get these ids from the standing page. If we the standing page is not available (it might
+        happensin old seasons), we try to make a match with existing teams. If this match doesn't exist, we need to
+        harcode the team and its id correspondance.
+
+        We create a team per season since a team can have different names along its history. Anyway, same teams
+        will have same acbid.
+        """
+        team_home, team_away = [teams.resolve(team_name) for team_name in team_names]
+        game.team_home_id, game.team_away_id = team_home.id, team_away.id
+        return team_home, team_away
+
+    @staticmethod
+    def create_many(games):
+        """
+        Insert many games at once with a single executemany, or update them if they already exist (e.g. if their page
+        has changed), without building model instances. The ids of the new games follow the order of the list.
+
+        :param games: list of GameRows, with their teams resolved. Their ids are set.
+        """
+        if not games:
+            return
+        columns = [Game._meta.columns[column] for column in GAME_FIELDS]
+        existing = dict(Game.select(Game.acbid, Game.id).where(Game.acbid << [game.acbid for game in games]).tuples())
+
+        """
+        A game inserted before is replaced by the new values of all its columns, as its participants are.
+        """
+        update_many(Game, 'acbid', [{column.name: game[column.db_column] for column in columns}
+                                    for game in games if game.acbid in existing])
+        insert_rows(Game, [column.name for column in columns],
+                    [tuple(column.db_value(game[column.db_column]) for column in columns)
+                     for game in games if game.acbid not in existing])
+
+        if len(existing) < len(games):
+            existing = dict(Game.select(Game.acbid, Game.id).where(Game.acbid << [game.acbid for game in games])
+                            .tuples())
+        for game in games:
+            game.id = existing[game.acbid]
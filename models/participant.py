@@ -1,11 +1,12 @@
 import re
-from pyquery import PyQuery as pq
 from collections import defaultdict
-from src.utils import fill_dict, replace_nth_ocurrence
-from models.basemodel import BaseModel
+from src.utils import replace_nth_ocurrence
+from src.records import StatLine, Referee, STAT_FIELDS
+from models.basemodel import BaseModel, insert_rows, update_many
 from models.game import Game
 from models.team import Team
 from models.actor import Actor
+from models.corrections import CORRECTIONS, apply_corrections
 from peewee import (PrimaryKeyField, TextField, IntegerField,
                     ForeignKeyField, BooleanField,)
 
@@ -50,82 +51,103 @@ class Participant(BaseModel):
     efficiency = IntegerField(null=True)
 
     @staticmethod
-    def create_instances(raw_game, game):
+    def create_instances(game_page, game):
         """
         Extract all the information regarding a participant from a game.
 
-        :param raw_game: string
+        :param game_page: GamePage
         :param game: Game instance
         """
-        Participant._create_players_and_coaches(raw_game, game)
-        Participant._create_referees(raw_game, game)
+        participants, scores = Participant.extract_data(game_page, game.acbid)
+        Participant.create_from_data(game, participants, scores, Participant.extract_referees(game_page))
 
     @staticmethod
-    def _fix_acbid(actor_name, acbid):
+    def create_from_data(game, participants, scores, referees):
         """
-        Modify the acbid of an actor.
+        Insert in the database the participants extracted from a game, and its final score.
 
-        :param actor_name: String
-        :param acbid: String
+        :param game: Game object or GameRow
+        :param participants: list of StatLines, as returned by Participant.extract_data
+        :param scores: dict, as returned by Participant.extract_data
+        :param referees: list of Referees
         """
-        actor = Actor.get(Actor.display_name == actor_name)
-        actor.acbid = acbid
-        actor.save()
+        if scores:
+            update_many(Game, 'id', [dict(scores, id=game.id)])
+            for attribute, score in scores.items():
+                setattr(game, attribute, score)
+
+        Participant.create_many([(game, participants, referees)])
 
     @staticmethod
-    def _fix_participations(actor_name, actual_acbid, wrong_acbid):
+    def create_many(games):
+        """
+        Insert in the database the participants of many games at once (e.g. a season): the actors are resolved with
+        a single query, the new ones are created with a single insert, and the participants and referees are inserted
+        with a single executemany.
+
+        :param games: list of (game, participants, referees) tuples, with the game as a GameRow or a Game object and
+        the participants and referees as returned by Participant.extract_data and Participant.extract_referees.
         """
-        In a few cases, acb has created two different actors for the same player. This method corrects this mistake,
-        by modifying the actor id in the games of the wrong actor.
 
-        :param actor_name: String
-        :param actual_acbid: String
-        :param wrong_acbid: String
-        :return:
         """
-        actor = Actor.get((Actor.display_name == actor_name) & (Actor.acbid == actual_acbid))
+        We need first to get or create the actors in the database.
 
-        try:
-            wrong_actor = Actor.get((Actor.display_name == actor_name) & (Actor.acbid == wrong_acbid))
+        We consider an actor as a player or a coach. We don't have information about referees so we don't include
+        them here.
+        """
+        actors = [{'acbid': stat_line.id, 'display_name': stat_line.display_name, 'is_coach': stat_line.is_coach}
+                  for _, participants, _ in games for stat_line in participants if stat_line.id is not None]
+        actors_ids = Actor.get_ids(actors)
 
-            for participation in wrong_actor.participations:
-                participation.actor = actor
-                participation.save()
-            wrong_actor.delete_instance()  # delete the wrong instance.
-        except Actor.DoesNotExist:
-            pass
+        """
+        The stat lines are inserted as they are, without dicts nor model instances.
+        """
+        rows = []
+        for game, participants, referees in games:
+            for stat_line in participants:
+                team_id = game.team_home_id if stat_line.team == 0 else game.team_away_id
+                rows.append((game.id, team_id, actors_ids[stat_line.id] if stat_line.id is not None else None) +
+                            stat_line.values())
+
+            """
+            We only have information about the name of a referee.
+            """
+            for referee in referees:
+                rows.append((game.id, None, None) + referee.values())
+
+        insert_rows(Participant, ['game', 'team', 'actor'] + STAT_FIELDS, rows)
 
     @staticmethod
     def fix_participants():
-        Participant._fix_acbid('Esteban, Màxim', '2CH')
-        Participant._fix_acbid('Sharabidze, G.', 'Y9G')
-        Participant._fix_participations('Tavares, W.', 'T2Z', 'SHP')
-        Participant._fix_participations('Stobart, Micky', 'B7P', 'FII')
-        Participant._fix_participations('Olaizola, Julen', 'T86', '162')
-        Participant._fix_participations('Izquierdo, Antonio', '773', 'YHK')
+        """
+        :return: list of int, the seasons whose participants have changed.
+        """
+        return apply_corrections()  # the errors of acb are listed in models/corrections.json.
+
+    @staticmethod
+    def extract_referees(game_page):
+        """
+        :param game_page: GamePage
+        :return: list of Referees of the game.
+        """
+        return [Referee(display_name=referee) for referee in game_page.referees]
 
     @staticmethod
-    def _create_players_and_coaches(raw_game, game):
+    def extract_data(game_page, acbid):
         """
-        Extract and create the information about players and coaches.
+        Extract the information about players and coaches of a game, without accessing the database.
 
-        :param raw_game: String
-        :param game: Game object
-        :return: List of Participant objects and list of Actor objects.
+        :param game_page: GamePage
+        :param acbid: String, acbid of the game.
+        :return: list of StatLines of the participants, where 'team' is 0 for the home team and 1 for the away team,
+        and dict with the final score of the game.
         """
-        estadisticas_tag = '.estadisticasnew' if re.search(r'<table class="estadisticasnew"',
-                                                           raw_game) else '.estadisticas'
-        doc = pq(raw_game)
-        info_players_data = doc(estadisticas_tag).eq(1)
 
         """
         We make sure we only retrieve stats that are in the header. One clear example can be found when the
         estadisticas_tag is 'estadisticas' since it hasn't got the +/- stat.
         """
-        header_text = info_players_data('tr').eq(1)
-        header = []
-        for index in header_text('td').items():
-            header.append(index.text())
+        header = list(game_page.header)
 
         """
         However, the acb ids of the stats are not unique and some of then are repeteated.
@@ -181,58 +203,52 @@ class Participant(BaseModel):
         where 'team' is the name of the team, 'player' is the number of the player and 'stat' is the acb stat id.
         """
         acb_error_player = None
+        scores = dict()
         stats = defaultdict(dict)
         current_team = None
         score_flag = 0
-        for tr in info_players_data('tr').items():  # iterate over each row
-            if tr('.estverde'):  # header
-                if tr.eq(0)('.estverdel'):  # team information
-                    current_team = 0 if current_team is None else 1  # first team home team
-                    stats[current_team] = defaultdict(dict)
-                else:  # omit indexes
-                    pass
+        for is_team_row, cells in game_page.rows:  # iterate over each row
+            if is_team_row:  # team information
+                current_team = 0 if current_team is None else 1  # first team home team
+                stats[current_team] = defaultdict(dict)
             else:  # players, equipo, and coach.
                 number = None
-                for cont, td in enumerate(tr('td').items()):  # iterate over each cell (stat)
-                    if td.text() == "5f":  # 5f nor Total are not players.
+                for cont, (text, href, is_starter) in enumerate(cells):  # iterate over each cell (stat)
+                    if text == "5f":  # 5f nor Total are not players.
                         break
 
-                    elif td.text() == 'Total' or number == 'Total':
+                    elif text == 'Total' or number == 'Total':
                         number = 'Total'
                         if score_flag < 2:
                             score_flag += 1
                             continue
                         elif score_flag == 2:
                             score_flag += 1
-                            game.score_home = int(td.text()) if current_team == 0 else game.score_home
-                            game.score_away = int(td.text()) if current_team == 1 else game.score_away
-                            game.save()
+                            scores['score_home' if current_team == 0 else 'score_away'] = int(text)
                             continue
                         else:
                             score_flag = 0
                             break
 
                     elif cont == 0:  # first cell number of the player
-                        number = td.text() if td.text() else 'Equipo'
+                        number = text if text else 'Equipo'
                         if number in stats[current_team]:  # preventing from errors with the number.
-                            wrong_pages_first = ['55313', '54017', '54026', '61072', '61076', '61107']  # if the good one is the first.
-                            wrong_pages_second = ['53154', '61218']  # if the good one is the second.
-                            if game.acbid in wrong_pages_first:  # acb error... >:(
+                            policy = CORRECTIONS['duplicated_numbers'].get(acbid)
+                            if policy == 'keep_first':  # acb error... >:(
                                 pass
-                            elif game.acbid in wrong_pages_second:
+                            elif policy == 'keep_second':
                                 stats[current_team][number] = acb_error_player
                                 break
                             else:  # sometimes th acb has some duplicated players (error).
-                                raise ValueError('Number {} does already exist in game {}!'.format(number, game.acbid))
+                                raise ValueError('Number {} does already exist in game {}!'.format(number, acbid))
                         else:
-                            # Create the dict with default attributes.
-                            stats[current_team][number] = fill_dict(header_to_db.values())
-                            stats[current_team][number]['is_starter'] = 1 if td('.gristit') else 0
-                            stats[current_team][number]['game'] = game
-                            stats[current_team][number]['team'] = game.team_home if current_team == 0 else game.team_away
-
-                    elif cont == 1 and td('a'):  # second cell player id
-                        href_attribute = td('a').attr('href').split("=")  # the acb id is in the href attribute.
+                            # Create the stat line with default attributes.
+                            stats[current_team][number] = StatLine.with_stats(header_to_db.values())
+                            stats[current_team][number]['is_starter'] = 1 if is_starter else 0
+                            stats[current_team][number]['team'] = current_team
+
+                    elif cont == 1 and href:  # second cell player id
+                        href_attribute = href.split("=")  # the acb id is in the href attribute.
                         stats[current_team][number]['id'] = href_attribute[-1]
 
                         is_coach = re.search(r'entrenador', href_attribute[0])
@@ -240,10 +256,10 @@ class Participant(BaseModel):
                         stats[current_team][number]['is_referee'] = 0
                         stats[current_team][number]['number'] = None if is_coach else int(number)
 
-                        display_name = td.text()
+                        display_name = text
                         stats[current_team][number]['display_name'] = display_name
                         if ',' in display_name:
-                            last_name, first_name = list(map(lambda x: x.strip(), td.text().split(",")))
+                            last_name, first_name = list(map(lambda x: x.strip(), text.split(",")))
                         else:  # E.g. San Emeterio
                             first_name = None
                             last_name = display_name
@@ -253,78 +269,29 @@ class Participant(BaseModel):
                     elif '%' in header[cont]:  # discard percentages.
                         continue
 
-                    elif '/' in td.text():  # T1, T2 or T3 in format success/attempts.
-                        success, attempts = td.text().split("/")
+                    elif '/' in text:  # T1, T2 or T3 in format success/attempts.
+                        success, attempts = text.split("/")
                         stats[current_team][number][header_to_db[header[cont]]] = int(success)
                         stats[current_team][number][header_to_db[header[cont]] + "_attempt"] = int(attempts)
 
-                    elif '+' in td.text():  # defensive and offensive rebounds in format D+O
-                        defensive, offensive = td.text().split("+")
+                    elif '+' in text:  # defensive and offensive rebounds in format D+O
+                        defensive, offensive = text.split("+")
                         stats[current_team][number]["defensive_reb"] = int(defensive)
                         stats[current_team][number]["offensive_reb"] = int(offensive)
 
-                    elif ':' in td.text():  # minutes in format minutes:seconds
-                        minutes, seconds = td.text().split(":")
+                    elif ':' in text:  # minutes in format minutes:seconds
+                        minutes, seconds = text.split(":")
                         stats[current_team][number]["minutes"] = int(minutes) * 60 + int(seconds)
 
                     else:
                         if header[cont] in header_to_db:  # only add useful stats.
                             try:
                                 stats[current_team][number][header_to_db[header[cont]]] = int(
-                                    td.text()) if td.text() else 0
+                                    text) if text else 0
                             except:
-                                stats[current_team][number][header_to_db[header[cont]]] = td.text()
+                                stats[current_team][number][header_to_db[header[cont]]] = text
 
                     acb_error_player = stats[current_team][number]
-        """
-        We now insert the participants of the game in the database.
-        Therefore, we need first to get or create the actors in the database.
-
-        We consider an actor as a player or a coach. We don't have information about referees so we don't include
-        them here.
-        """
-        to_insert_many_participants = []
-        actors = []
-        for team, team_dict in stats.items():
-            for player, player_stats in team_dict.items():
-                try:
-                    actor = Actor.get_or_create(acbid=stats[team][player]['id'])
-                    if actor[1]:
-                        actor[0].display_name = stats[team][player]['display_name']
-                        actor[0].is_coach = stats[team][player]['is_coach']
-                        actor[0].save()
-                        actors.append(actor)
-                    stats[team][player]['actor'] = actor[0]
-                    stats[team][player].pop('id')
-                except KeyError:
-                    pass
-                to_insert_many_participants.append(stats[team][player])
-
-        participants = Participant.insert_many(to_insert_many_participants)
-        participants.execute()
-
 
-    @staticmethod
-    def _create_referees(raw_game, game):
-        """
-        Extract and introduce in the database the referees of the game.
-
-        :param raw_game: String
-        :return: List of Referee objects
-        """
-        estadisticas_tag = '.estadisticasnew' if re.search(r'<table class="estadisticasnew"',
-                                                           raw_game) else '.estadisticas'
-        doc = pq(raw_game)
-        info_game_data = doc(estadisticas_tag).eq(0)
-        referees_data = info_game_data('.estnaranja')('td').eq(0).text()
-        referees = None
-        if referees_data:
-            referees = referees_data.split(":")[1].strip().split(",")
-            referees = list(filter(None, referees))
-            referees = list(map(lambda x: x.strip(), referees))
-
-        """
-        We only have information about the name of a referee.
-        """
-        for referee in referees:
-            Participant.create(**{'display_name': referee, 'game': game, 'is_referee': 1})
\ No newline at end of file
+        participants = [player_stats for team_dict in stats.values() for player_stats in team_dict.values()]
+        return participants, scores
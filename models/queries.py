@@ -0,0 +1,89 @@
+"""
+Read path of the database: the lookups that the analyses run constantly. Each one is a constant SQL statement with
+parameters, so sqlite3 prepares it once and reuses it from its statement cache, and it is answered by the composite
+indexes of schema.sql (participant(actor_id, game_id), game(team_home_id, kickoff_time) and
+game(team_away_id, kickoff_time)). The best players of a season are the leaderboards of models/aggregates.py
+(get_leaderboard).
+
+The rows are returned as dicts.
+"""
+from models.basemodel import DATABASE
+from models.aggregates import STATS
+from src.constants import FIRST_SEASON, get_acbid_range
+
+SEASON = "CAST(substr(g.acbid, 1, 2) AS INTEGER) + {}".format(FIRST_SEASON - 1)
+GAME_COLUMNS = ('g.id AS game_id, g.acbid, {} AS season, g.competition_phase, g.round_phase, g.journey, '
+                'g.kickoff_time'.format(SEASON))
+PARTICIPANT_STATS = ', '.join('p.' + stat for stat in STATS)
+
+PLAYER_GAME_LOG_QUERY = (
+    'SELECT {}, p.team_id, '
+    '       CASE WHEN p.team_id = g.team_home_id THEN g.team_away_id ELSE g.team_home_id END AS opponent_id, '
+    '       p.is_starter, {} '
+    'FROM participant p JOIN game g ON g.id = p.game_id '
+    'WHERE p.actor_id = ? AND g.acbid BETWEEN ? AND ? '
+    'ORDER BY g.kickoff_time, g.id'.format(GAME_COLUMNS, PARTICIPANT_STATS))
+
+# The home and away games are two lookups of the indexes, instead of an OR that would scan the table.
+TEAM_GAME_LOG_QUERY = (
+    'SELECT * FROM ('
+    '    SELECT {0}, 1 AS is_home, g.team_away_id AS opponent_id, '
+    '           g.score_home AS points_for, g.score_away AS points_against '
+    '    FROM game g WHERE g.team_home_id = ? AND g.acbid BETWEEN ? AND ? '
+    '    UNION ALL '
+    '    SELECT {0}, 0 AS is_home, g.team_home_id AS opponent_id, '
+    '           g.score_away AS points_for, g.score_home AS points_against '
+    '    FROM game g WHERE g.team_away_id = ? AND g.acbid BETWEEN ? AND ?) '
+    'ORDER BY kickoff_time, game_id'.format(GAME_COLUMNS))
+
+HEAD_TO_HEAD_QUERY = (
+    'SELECT {}, g.team_home_id, g.team_away_id, g.score_home, g.score_away FROM game g '
+    'WHERE (g.team_home_id = ? AND g.team_away_id = ?) OR (g.team_home_id = ? AND g.team_away_id = ?) '
+    'ORDER BY g.kickoff_time, g.id'.format(GAME_COLUMNS))
+
+ALL_SEASONS = ('', '~')  # every acbid is between them.
+
+
+def _fetch(query, parameters):
+    """
+    :param query: String
+    :param parameters: tuple
+    :return: list of dicts
+    """
+    cursor = DATABASE.execute_sql(query, parameters)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def get_player_game_log(actor_id, season=None):
+    """
+    Get the games of a player (or coach) with their stats, in order.
+
+    :param actor_id: int
+    :param season: int, or None for every season.
+    :return: list of dicts
+    """
+    return _fetch(PLAYER_GAME_LOG_QUERY, (actor_id,) + (get_acbid_range(season) if season else ALL_SEASONS))
+
+
+def get_team_game_log(team_id, season):
+    """
+    Get the games of a team in a season, in order, with the points scored and received.
+
+    :param team_id: int
+    :param season: int
+    :return: list of dicts
+    """
+    acbid_range = get_acbid_range(season)
+    return _fetch(TEAM_GAME_LOG_QUERY, (team_id,) + acbid_range + (team_id,) + acbid_range)
+
+
+def get_head_to_head(team_id, opponent_id):
+    """
+    Get every game between two teams, in order.
+
+    :param team_id: int
+    :param opponent_id: int
+    :return: list of dicts
+    """
+    return _fetch(HEAD_TO_HEAD_QUERY, (team_id, opponent_id, opponent_id, team_id))
@@ -60,11 +60,15 @@ CREATE TABLE game (
     score_away_extra INTEGER,
 
     -- True flag if all the information with respect to the game has been inserted correctly.
-    db_flag BOOLEAN
+    db_flag BOOLEAN,
+
+    -- SHA-1 of the page the game was inserted from, to skip the pages that haven't changed.
+    page_sha1 TEXT
 );
 CREATE INDEX game_acbid_idx ON game(acbid);
-CREATE INDEX game_team_home_id_idx ON game(team_home_id);
-CREATE INDEX game_team_away_id_idx ON game(team_away_id);
+-- The games of a team in order, e.g. its game log (see models/queries.py).
+CREATE INDEX game_team_home_id_kickoff_time_idx ON game(team_home_id, kickoff_time);
+CREATE INDEX game_team_away_id_kickoff_time_idx ON game(team_away_id, kickoff_time);
 CREATE INDEX game_kickoff_time_idx ON game(kickoff_time);
 
 
@@ -171,8 +175,167 @@ CREATE TABLE participant (
 );
 CREATE INDEX participant_game_id_idx ON participant(game_id);
 CREATE INDEX participant_team_id_idx ON participant(team_id);
-CREATE INDEX participant_actor_id_idx ON participant(actor_id);
+-- The games of an actor, e.g. its game log (see models/queries.py).
+CREATE INDEX participant_actor_id_game_id_idx ON participant(actor_id, game_id);
+
+
+/* Aggregates of the participants, refreshed after each ingest by models/aggregates.py. The stats are the sums over the
+ * games, the per-game averages are the sums divided by the games. */
+CREATE TABLE playerSeason (
+    actor_id INTEGER REFERENCES actor NOT NULL,
+    season INTEGER NOT NULL,
+
+    -- Games in which the player is in the box score, and games in which the player started.
+    games INTEGER,
+    games_started INTEGER,
+
+    minutes INTEGER,
+    point INTEGER,
+    t2_attempt INTEGER,
+    t2 INTEGER,
+    t3_attempt INTEGER,
+    t3 INTEGER,
+    t1_attempt INTEGER,
+    t1 INTEGER,
+    defensive_reb INTEGER,
+    offensive_reb INTEGER,
+    assist INTEGER,
+    steal INTEGER,
+    turnover INTEGER,
+    counterattack INTEGER,
+    block INTEGER,
+    received_block INTEGER,
+    dunk INTEGER,
+    fault INTEGER,
+    received_fault INTEGER,
+    plus_minus INTEGER,
+    efficiency INTEGER,
+
+    -- Percentages of the shots scored. NULL if there wasn't any attempt.
+    t2_pct REAL,
+    t3_pct REAL,
+    t1_pct REAL,
+
+    PRIMARY KEY (actor_id, season)
+);
+CREATE INDEX playerSeason_season_idx ON playerSeason(season);
+
+CREATE TABLE playerCareer (
+    actor_id INTEGER PRIMARY KEY REFERENCES actor,
+    seasons INTEGER,
+    first_season INTEGER,
+    last_season INTEGER,
+    games INTEGER,
+    games_started INTEGER,
+
+    minutes INTEGER,
+    point INTEGER,
+    t2_attempt INTEGER,
+    t2 INTEGER,
+    t3_attempt INTEGER,
+    t3 INTEGER,
+    t1_attempt INTEGER,
+    t1 INTEGER,
+    defensive_reb INTEGER,
+    offensive_reb INTEGER,
+    assist INTEGER,
+    steal INTEGER,
+    turnover INTEGER,
+    counterattack INTEGER,
+    block INTEGER,
+    received_block INTEGER,
+    dunk INTEGER,
+    fault INTEGER,
+    received_fault INTEGER,
+    plus_minus INTEGER,
+    efficiency INTEGER,
 
+    -- Percentages of the shots scored. NULL if there wasn't any attempt.
+    t2_pct REAL,
+    t3_pct REAL,
+    t1_pct REAL
+);
+
+/* The stats of a team include the 'Equipo' row (e.g. team rebounds), but not the coaches. */
+CREATE TABLE teamSeasonOpponent (
+    team_id INTEGER REFERENCES team NOT NULL,
+    season INTEGER NOT NULL,
+    opponent_id INTEGER REFERENCES team NOT NULL,
+    games INTEGER,
+    wins INTEGER,
+    losses INTEGER,
+
+    -- Points scored and received, according to the final score of the games.
+    points_for INTEGER,
+    points_against INTEGER,
+
+    minutes INTEGER,
+    point INTEGER,
+    t2_attempt INTEGER,
+    t2 INTEGER,
+    t3_attempt INTEGER,
+    t3 INTEGER,
+    t1_attempt INTEGER,
+    t1 INTEGER,
+    defensive_reb INTEGER,
+    offensive_reb INTEGER,
+    assist INTEGER,
+    steal INTEGER,
+    turnover INTEGER,
+    counterattack INTEGER,
+    block INTEGER,
+    received_block INTEGER,
+    dunk INTEGER,
+    fault INTEGER,
+    received_fault INTEGER,
+    plus_minus INTEGER,
+    efficiency INTEGER,
 
+    -- Percentages of the shots scored. NULL if there wasn't any attempt.
+    t2_pct REAL,
+    t3_pct REAL,
+    t1_pct REAL,
 
+    PRIMARY KEY (team_id, season, opponent_id)
+);
+CREATE INDEX teamSeasonOpponent_season_idx ON teamSeasonOpponent(season);
 
+CREATE TABLE teamSeason (
+    team_id INTEGER REFERENCES team NOT NULL,
+    season INTEGER NOT NULL,
+    games INTEGER,
+    wins INTEGER,
+    losses INTEGER,
+    points_for INTEGER,
+    points_against INTEGER,
+
+    minutes INTEGER,
+    point INTEGER,
+    t2_attempt INTEGER,
+    t2 INTEGER,
+    t3_attempt INTEGER,
+    t3 INTEGER,
+    t1_attempt INTEGER,
+    t1 INTEGER,
+    defensive_reb INTEGER,
+    offensive_reb INTEGER,
+    assist INTEGER,
+    steal INTEGER,
+    turnover INTEGER,
+    counterattack INTEGER,
+    block INTEGER,
+    received_block INTEGER,
+    dunk INTEGER,
+    fault INTEGER,
+    received_fault INTEGER,
+    plus_minus INTEGER,
+    efficiency INTEGER,
+
+    -- Percentages of the shots scored. NULL if there wasn't any attempt.
+    t2_pct REAL,
+    t3_pct REAL,
+    t1_pct REAL,
+
+    PRIMARY KEY (team_id, season)
+);
+CREATE INDEX teamSeason_season_idx ON teamSeason(season);
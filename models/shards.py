@@ -0,0 +1,82 @@
+"""
+A shard is a database with the games of a single season, built on its own by a separate process. The shards are
+merged in the main database: the teams and actors are unified by their acbid, and the foreign keys of the names of the
+teams, the games and the participants are remapped to the ids of the main database.
+"""
+from models.basemodel import DATABASE
+
+DIMENSIONS = ['team', 'actor']
+FACTS = ['teamName', 'game', 'participant']
+FOREIGN_KEYS = {'teamName': {'team_id': 'team'},
+                'game': {'team_home_id': 'team', 'team_away_id': 'team'},
+                'participant': {'game_id': 'game', 'team_id': 'team', 'actor_id': 'actor'}}
+
+
+def _columns(table):
+    """
+    Columns of a table of the main database, but the id.
+
+    :param table: String
+    :return: list of Strings
+    """
+    return [row[1] for row in DATABASE.execute_sql('PRAGMA main.table_info({})'.format(table)).fetchall()
+            if row[1] != 'id']
+
+
+def _create_map(table, query):
+    """
+    Create a temporary table mapping the ids of a table in the shard to the ids in the main database.
+
+    :param table: String
+    :param query: String, SELECT of (old_id, new_id) rows.
+    """
+    DATABASE.execute_sql('DROP TABLE IF EXISTS temp.{}_map'.format(table))
+    DATABASE.execute_sql('CREATE TEMP TABLE {}_map (old_id INTEGER PRIMARY KEY, new_id INTEGER)'.format(table))
+    DATABASE.execute_sql('INSERT INTO temp.{}_map {}'.format(table, query))
+
+
+def _copy_rows(table):
+    """
+    Copy the rows of a table from the shard to the main database, in the same order, remapping its foreign keys.
+
+    :param table: String
+    """
+    columns = _columns(table)
+    values, joins = [], []
+    for column in columns:
+        if column in FOREIGN_KEYS.get(table, dict()):
+            alias = column + '_map'
+            joins.append('LEFT JOIN temp.{}_map {} ON {}.old_id = s.{}'.format(FOREIGN_KEYS[table][column], alias,
+                                                                                alias, column))
+            values.append(alias + '.new_id')
+        else:
+            values.append('s.' + column)
+
+    DATABASE.execute_sql('INSERT OR IGNORE INTO main.{} ({}) SELECT {} FROM shard.{} s {} ORDER BY s.id'.format(
+        table, ', '.join(columns), ', '.join(values), table, ' '.join(joins)))
+
+
+def merge_shard(shard_path):
+    """
+    Merge the database of a season into the main database.
+
+    :param shard_path: String
+    """
+    DATABASE.execute_sql('ATTACH DATABASE ? AS shard', (shard_path,))
+    try:
+        with DATABASE.atomic():
+            for table in DIMENSIONS:  # the teams and actors that are new, in the order they were created.
+                columns = ', '.join(_columns(table))
+                DATABASE.execute_sql('INSERT INTO main.{0} ({1}) SELECT {1} FROM shard.{0} '
+                                     'WHERE acbid NOT IN (SELECT acbid FROM main.{0}) ORDER BY id'.format(table,
+                                                                                                          columns))
+                # acb has a few duplicated actors, we take the first one as Actor.get_ids does.
+                _create_map(table, 'SELECT s.id, m.id FROM shard.{0} s JOIN (SELECT acbid, MIN(id) AS id '
+                                   'FROM main.{0} GROUP BY acbid) m ON m.acbid = s.acbid'.format(table))
+
+            for table in FACTS:
+                _copy_rows(table)
+                if table == 'game':
+                    _create_map(table, 'SELECT s.id, m.id FROM shard.game s JOIN main.game m ON m.acbid = s.acbid')
+    finally:
+        DATABASE.execute_sql('DETACH DATABASE shard')
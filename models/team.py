@@ -1,8 +1,8 @@
-import os.path, logging
+import os.path, re, difflib, logging
 from pyquery import PyQuery as pq
 from peewee import ForeignKeyField
-from src.download import open_or_download
-from models.basemodel import BaseModel
+from src.download import SESSION, read_content, is_stored, download_many
+from models.basemodel import DATABASE, BaseModel, update_many
 from src.season import Season
 from peewee import (PrimaryKeyField, TextField, IntegerField)
 
@@ -58,42 +58,57 @@ class Team(BaseModel):
         return harcoded_teams
 
     @staticmethod
-    def update_content(logging_level=logging.INFO):
+    def update_content(workers=1, logging_level=logging.INFO):
         """
         First we insert the instances in the database with basic information and later we update the rest of fields.
         We update the information of the teams that have not been filled yet in the database.
+
+        The pages of the teams are fetched by `workers` threads and parsed by `workers` processes, and all the teams
+        are updated with a single executemany statement.
+
+        :param workers: int
+        :param logging_level: logging object
         """
+        from src.season import BASE_URL, TEAMS_PATH
+        from src.ingest import parse_files  # src.ingest imports the models.
         logging.basicConfig(level=logging_level)
         logger = logging.getLogger(__name__)
 
         logger.info('Starting to update the teams that have not been filled yet...')
-        teams = Team.select().where(Team.founded_year >> None)
-        for cont, team in enumerate(teams):
-            team._update_content()
-            try:
-                if len(teams) and cont % (round(len(teams) / 3)) == 0:
-                    logger.info('{}% already updated'.format(round(float(cont) / len(teams) * 100)))
-            except ZeroDivisionError:
-                pass
+        pages = {team.acbid: (os.path.join(TEAMS_PATH, team.acbid + '.html'),
+                              os.path.join(BASE_URL, 'club.php?cod_competicion=LACB&id={}'.format(team.acbid)))
+                 for team in Team.select(Team.acbid).where(Team.founded_year >> None)}
+
+        # Only the missing pages are downloaded, and all of them if they are being revalidated.
+        list(download_many([(filename, url) for filename, url in pages.values()
+                            if SESSION.revalidate or not is_stored(filename)], workers=workers))
+
+        # Parsed before the transaction, the processes must not inherit it.
+        acbids = [acbid for acbid, (filename, _) in pages.items() if is_stored(filename)]
+        founded_years = parse_files(Team.parse_page, [pages[acbid][0] for acbid in acbids], workers=workers)
+
+        with DATABASE.atomic():
+            update_many(Team, 'acbid', [{'acbid': acbid, 'founded_year': founded_year}
+                                        for acbid, founded_year in zip(acbids, founded_years)
+                                        if founded_year is not None])
 
-        logger.info('Update finished! ({} teams)\n'.format(len(teams)))
+        logger.info('Update finished! ({} teams)\n'.format(len(acbids)))
 
-    def _update_content(self):
+    @staticmethod
+    def parse_page(file_path):
         """
-        First we insert the instances in the database with basic information and later we update the rest of fields.
-        :return:
+        Extract the founded year of a team from its page.
+
+        :param file_path: String
+        :return: int, or None if the founded year is not a number.
         """
-        from src.season import BASE_URL, TEAMS_PATH
-        filename = os.path.join(TEAMS_PATH, self.acbid + '.html')
-        url = os.path.join(BASE_URL, 'club.php?cod_competicion=LACB&id={}'.format(self.acbid))
-        content = open_or_download(file_path=filename, url=url)
         try:
-            self.founded_year = self._get_founded_year(content)
-            self.save()
+            return Team._get_founded_year(read_content(file_path))
         except ValueError:
-            pass
+            return None
 
-    def _get_founded_year(self, raw_team):
+    @staticmethod
+    def _get_founded_year(raw_team):
         """
         Extract the founded year of a team.
         :param raw_team: String
@@ -148,3 +163,103 @@ class TeamName(BaseModel):
         TeamName.create_instance('COREN ORENSE', 'ORE', 2004)
         TeamName.create_instance('SOMONTANO HUESCA', 'HUE', 2004)
         TeamName.create_instance('7UP JOVENTUT', 'JOV', 2004)
+
+
+def normalize_team_name(team_name):
+    """
+    Normalize the punctuation and spaces of the name of a team, e.g. 'C.B. OURENSE' -> 'CB OURENSE'.
+
+    :param team_name: String
+    :return: String
+    """
+    return ' '.join(re.sub(r'[.,\-\'"]', '', team_name.upper()).split())
+
+
+class TeamResolver:
+    """
+    Resolves the names of the teams in the games of a season to their Team, in memory.
+
+    It is built once per season from the standing page, the hardcoded teams and the TeamName of the previous
+    seasons, and every name is resolved only once. Hence, it must be built after Team.create_instances(season).
+    """
+    def __init__(self, season):
+        self.season = season
+        self.teams_ids = season.get_teams_ids()
+        self.harcoded_teams = Team.get_harcoded_teams().get(season.season, dict())
+        self.teams = {team.acbid: team for team in Team.select()}
+
+        self.teams_names = dict()  # first name of each team in any season, as TeamName.get(TeamName.name == name).
+        self.season_names = dict()  # first name of each team in this season, i.e. its name in the standing page.
+        self.registered_names = set()  # names that already have a TeamName in this season.
+        for team_name in TeamName.select(TeamName, Team).join(Team).order_by(TeamName.season, TeamName.id):
+            self.teams_names.setdefault(team_name.name, team_name.team.acbid)
+            if team_name.season == season.season:
+                self.season_names.setdefault(team_name.team.acbid, team_name.name)
+                self.registered_names.add(team_name.name)
+
+        self.normalized_names = dict()
+        for team_name in self.teams_ids:
+            self.normalized_names.setdefault(normalize_team_name(team_name), team_name)
+
+        self._memo = dict()
+
+    def resolve(self, team_name):
+        """
+        Get the team of a name, and record the name of the team in this season.
+
+        :param team_name: String
+        :return: Team object
+        """
+        if team_name not in self._memo:
+            team = self.teams[self._find_acbid(team_name)]
+            if team_name not in self.registered_names:
+                TeamName.get_or_create(**{'team': team, 'name': team_name, 'season': self.season.season})
+                self.registered_names.add(team_name)
+                self.teams_names.setdefault(team_name, team.acbid)
+                self.season_names.setdefault(team.acbid, team_name)
+            self._memo[team_name] = team
+        return self._memo[team_name]
+
+    def get_name(self, team):
+        """
+        Get the name of a team in this season, the one of the standing page if it exists.
+
+        :param team: Team object
+        :return: String
+        """
+        return self.season_names[team.acbid]
+
+    def _find_acbid(self, team_name):
+        """
+        Note: ACB doesn't agree in teams names and sometimes write the same name in different ways.
+        E.g.:
+
+         - VALENCIA BASKET instead of VALENCIA BASKET CLUB
+         - C.B. OURENSE instead of CB OURENSE
+
+        :param team_name: String
+        :return: String, acbid of the team.
+        """
+        logging.basicConfig(level=logging.INFO)
+        logger = logging.getLogger(__name__)
+
+        if len(self.teams_ids):  # if the standing page exists.
+            acbid = self.teams_ids.get(team_name)
+        else:
+            acbid = self.teams_names.get(team_name)
+        if acbid is not None:
+            return acbid
+
+        # We don't find an exact correspondance, let's find the closest match.
+        if team_name in self.harcoded_teams:  # harcoded team?
+            return self.harcoded_teams[team_name]
+
+        most_likely_team = self.normalized_names.get(normalize_team_name(team_name))
+        if most_likely_team is None:
+            most_likely_team = difflib.get_close_matches(team_name, self.teams_ids.keys(), 1, 0.4)[0]
+
+        if most_likely_team not in self.season.mismatched_teams:  # debug info to check the correctness.
+            self.season.mismatched_teams.append(most_likely_team)
+            logger.info('Season {} -> {} has been matched to: {}'.format(self.season.season, team_name,
+                                                                         most_likely_team))
+        return self.teams_ids[most_likely_team]
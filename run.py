@@ -1,47 +1,108 @@
-import argparse, os, re
-from models.basemodel import DATABASE, reset_database
+import argparse, os, contextlib, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from models.basemodel import DATABASE, DB_PATH, reset_database, migrate_database, bulk_load, BULK_LOAD_PRAGMAS
 from models.game import Game
-from models.team import TeamName, Team
+from models.team import TeamName, Team, TeamResolver
 from models.actor import Actor
 from models.participant import Participant
-from src.season import Season
+import src.season
+from src.season import Season, DATA_PATH, TEAMS_PATH, PLAYERS_PATH, COACHES_PATH
+from src.download import SESSION, report_failures
+from src.ingest import parse_games
+from src.staging import write_staging, read_staging, has_staging
+from src.pack import pack_directory
+from src.snapshot import export_snapshot
+from src.export import export_database, FORMATS
+from models.shards import merge_shard
+from models.aggregates import refresh_aggregates
 
+SHARDS_PATH = os.path.join(DATA_PATH, 'shards')
 
-def download_games(season):
+
+def download_games(season, workers=1, repair=False):
     """
     Download locally the games of a certain season
     :param season: Season object.
+    :param workers: int, number of concurrent downloads.
+    :param repair: bool, download again the games that fail the sanity check.
     """
-    Game.save_games(season)
-    Game.sanity_check(season)
+    Game.save_games(season, workers=workers)
+    Game.sanity_check(season, repair=repair)
 
 
-def insert_games(season):
+def insert_games(season, workers=1, incremental=False):
     """
     Extract and insert the information regarding the games of a season.
     :param season: Season object.
+    :param workers: int, number of processes parsing the pages.
+    :param incremental: bool, skip the games whose page hasn't changed since they were inserted.
+    :return: int, number of games inserted or updated.
+    """
+    return load_games(season, extract_games(season, workers=workers, incremental=incremental), incremental=incremental)
+
+
+def extract_games(season, workers=1, incremental=False):
+    """
+    Parse the pages of the games of a season into plain records, and keep them in the staging files of the season.
+    The pages are parsed by a pool of `workers` processes.
+    :param season: Season object.
+    :param workers: int, number of processes parsing the pages.
+    :param incremental: bool, take the records of the pages that haven't changed from the staging files instead of
+    parsing them again.
+    :return: list of GameRecords.
+    """
+    previous = dict()
+    if incremental and has_staging(season):
+        previous = {record.id_game_number: record for record in read_staging(season)}
+    known_hashes = {id_game_number: record.sha1 for id_game_number, record in previous.items()}
+
+    records = parse_games(season, workers=workers, known_hashes=known_hashes)
+    records = [record or previous[id_game_number] for id_game_number, record in enumerate(records, start=1)]
+    write_staging(season, records)
+    return records
+
+
+def load_games(season, records, incremental=False):
+    """
+    Insert the records of the games of a season in the database. This process is the only one writing in the
+    database: it resolves the teams and actors and inserts the games in order.
+
+    A game inserted before is updated and its participants are replaced. In incremental mode, the games whose page
+    has the same hash as when they were inserted are skipped.
+    :param season: Season object.
+    :param records: list of GameRecords, from extract_games or from the staging files.
+    :param incremental: bool
+    :return: int, number of games inserted or updated.
     """
     if season.season == 1994:  # the 1994 season doesn't have standing page.
         TeamName.create_harcoded_teams()
 
+    records = iter(records)
+    games = []  # (GameRow, participants, referees), inserted all together at the end of the season.
     with DATABASE.atomic():
+        ingested = Game.get_ingested(season)
+
+        def is_unchanged(record):
+            game = ingested.get(Game.get_acbid(season, record.id_game_number))
+            return incremental and game is not None and game.page_sha1 == record.sha1
+
         # Create the instances of Team.
         Team.create_instances(season)
+        teams = TeamResolver(season)
 
         # Regular season
         competition_phase = 'regular'
         round_phase = None
         for id_game_number in range(1, season.get_number_games_regular_season() + 1):
-            with open(os.path.join('..', 'data', str(season.season), 'games', str(id_game_number) + '.html'),
-                      'r') as f:
-                raw_game = f.read()
+            record = next(records)
+            if is_unchanged(record):
+                continue
 
-                game = Game.create_instance(raw_game=raw_game, id_game_number=id_game_number,
-                                            season=season,
-                                            competition_phase=competition_phase,
-                                            round_phase=round_phase)
+            game = record.game.replace(competition_phase=competition_phase, round_phase=round_phase,
+                                       page_sha1=record.sha1, **record.scores)
+            Game.resolve_teams(game, record.team_names, teams)
 
-                Participant.create_instances(raw_game=raw_game, game=game)
+            games.append((game, record.participants, record.referees))
 
         # Playoff
         competition_phase = 'playoff'
@@ -57,85 +118,229 @@ def insert_games(season):
 
         while id_game_number < playoff_end:
             id_game_number += 1
-            with open(os.path.join('..', 'data', str(season.season), 'games', str(id_game_number) + '.html'),
-                      'r') as f:
-                raw_game = f.read()
-
-                # A playoff game might be blank if the series ends before the last game.
-                if re.search(r'<title>ACB.COM</title>', raw_game) \
-                        and (re.search(r'"estverdel"> <', raw_game)
-                             or re.search(r'<font style="font-size : 12pt;">0 |', raw_game)):
+            record = next(records)
+
+            # A playoff game might be blank if the series ends before the last game.
+            if record.game is None:
+                cont += 1
+                continue
+
+            if is_unchanged(record):  # it keeps the round it was classified in.
+                if ingested[record.game['acbid']].competition_phase != 'relegation_playoff':
                     cont += 1
-                    continue
+                continue
 
-                game = Game.create_instance(raw_game=raw_game, id_game_number=id_game_number,
-                                            season=season,
-                                            competition_phase=competition_phase,
-                                            round_phase=round_phase)
+            game = record.game.replace(competition_phase=competition_phase, round_phase=round_phase,
+                                       page_sha1=record.sha1, **record.scores)
+            team_home, team_away = Game.resolve_teams(game, record.team_names, teams)
 
-                home_team_name = TeamName.get(
-                    (TeamName.team == game.team_home) & (TeamName.season == season.season)).name
-                away_team_name = TeamName.get(
-                    (TeamName.team == game.team_away) & (TeamName.season == season.season)).name
+            home_team_name = teams.get_name(team_home)
+            away_team_name = teams.get_name(team_away)
 
-                if (home_team_name or away_team_name) in relegation_teams:
-                    game.competition_phase = 'relegation_playoff'
+            if (home_team_name or away_team_name) in relegation_teams:
+                game.competition_phase = 'relegation_playoff'
+            else:
+                if cont < quarter_finals_limit:
+                    game.round_phase = 'quarter_final'
+                elif cont < semifinals_limit:
+                    game.round_phase = 'semifinal'
                 else:
-                    if cont < quarter_finals_limit:
-                        game.round_phase = 'quarter_final'
-                    elif cont < semifinals_limit:
-                        game.round_phase = 'semifinal'
-                    else:
-                        game.round_phase = 'final'
-                    cont += 1
+                    game.round_phase = 'final'
+                cont += 1
+
+            games.append((game, record.participants, record.referees))
+
+        # Insert the games, and the participants replacing the ones of the games inserted before.
+        Game.create_many([game for game, _, _ in games])
+        replaced = [ingested[game.acbid].id for game, _, _ in games if game.acbid in ingested]
+        if replaced:
+            Participant.delete().where(Participant.game << replaced).execute()
+        Participant.create_many(games)
+    return len(games)
+
+
+def ingest_shard(year, shard_path, load=False):
+    """
+    Insert the games of a season in a database of its own. It runs in a separate process.
+    :param year: int
+    :param shard_path: String, path of the database of the season.
+    :param load: bool, insert the staging files of the season, if any, instead of parsing the pages.
+    :return: String, shard_path.
+    """
+    reset_database(defer_indexes=True, db_path=shard_path)
+    for pragma in BULK_LOAD_PRAGMAS:
+        DATABASE.execute_sql(pragma)
+
+    season = Season(year)
+    # The hardcoded teams might only have been created by the standings of other seasons.
+    for acbid in Team.get_harcoded_teams().get(year, dict()).values():
+        Team.get_or_create(**{'acbid': acbid})
+
+    if load and has_staging(season):
+        load_games(season, read_staging(season))
+    else:
+        insert_games(season)
+    DATABASE.close()
+    return shard_path
 
-                game.save()
 
-                # Create the instances of Participant
-                Participant.create_instances(raw_game=raw_game, game=game)
+def insert_sharded(years, workers=1, load=False):
+    """
+    Insert the games of many seasons, each one in its own database by a pool of `workers` processes. The databases
+    are merged, in the same order as a sequential insertion, into the current one.
+
+    The seasons without standing page resolve their teams with the names of the other seasons, so they are inserted
+    directly in the current database when their turn comes.
+    :param years: list of int, in the order of insertion.
+    :param workers: int, number of processes.
+    :param load: bool, insert the staging files of the seasons, if any, instead of parsing the pages.
+    """
+    os.makedirs(SHARDS_PATH, exist_ok=True)
+    sharded = [year for year in years if Season(year).get_teams_ids()]
+
+    # Spawned processes don't inherit the connection to the current database.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        shards = {year: executor.submit(ingest_shard, year,
+                                        os.path.abspath(os.path.join(SHARDS_PATH, str(year) + '.db')), load)
+                  for year in sharded}
+
+        for year in years:
+            if year not in shards:
+                season = Season(year)
+                if load and has_staging(season):
+                    load_games(season, read_staging(season))
+                else:
+                    insert_games(season, workers=workers)
+                continue
+
+            shard_path = shards[year].result()
+            merge_shard(shard_path)
+            for path in [shard_path, shard_path + '-wal', shard_path + '-shm']:
+                if os.path.exists(path):
+                    os.remove(path)
 
 
-def update_games():
+def pack_pages(seasons):
+    """
+    Move the downloaded pages into one compressed archive per directory.
+    :param seasons: list of Season objects.
+    """
+    for season in seasons:
+        pack_directory(season.GAMES_PATH)
+    for directory in [TEAMS_PATH, PLAYERS_PATH, COACHES_PATH]:
+        pack_directory(directory)
+
+
+def update_games(workers=1, repair=False):
     """
     Update the information about teams and actors and correct errors.
+    :param workers: int, number of concurrent downloads and of processes parsing the pages.
+    :param repair: bool, download again the actors that fail the sanity check.
+    :return: list of int, the seasons changed by the corrections of the participants.
     """
     # Download actor's page.
-    Actor.save_actors()
-    Actor.sanity_check()
+    Actor.save_actors(workers=workers)
+    Actor.sanity_check(repair=repair)
 
-    with DATABASE.atomic():
-        Team.update_content()
-        Participant.fix_participants()  # there were a few errors in acb. Manually fix them.
-        Actor.update_content()
+    # Each step has its own transaction, the pages of the teams and actors are parsed in processes before it.
+    Team.update_content(workers=workers)
+    corrected = Participant.fix_participants()  # there were a few errors in acb. Manually fix them.
+    Actor.update_content(workers=workers)
+    return corrected
 
 
 def main(args):
+    # A new database is filled with the bulk load profile, and its indexes are created at the end.
+    bulk = args.r and (args.i or args.load)
     if args.r:  # reset the database.
-        reset_database()
+        reset_database(defer_indexes=bulk)
+    else:  # a database created by a previous version might lack the newest tables, columns or indexes.
+        migrate_database()
 
     first_season = args.first_season
     last_season = args.last_season+1
 
+    if args.base_url:  # e.g. a local replay server (src/replay.py) instead of acb.com.
+        src.season.BASE_URL = args.base_url
+
+    if args.refresh:  # ask acb.com again for the pages already downloaded, only the changed ones are fetched.
+        SESSION.revalidate = True
+
     if args.d:  # download the games.
         for year in reversed(range(first_season, last_season)):
             season = Season(year)
-            download_games(season)
+            download_games(season, workers=args.workers, repair=args.repair)
 
-    if args.i:
-        # Extract and insert the information in the database.
+    if args.extract:  # only parse the pages into the staging files.
         for year in reversed(range(first_season, last_season)):
-            season = Season(year)
-            insert_games(season)
+            extract_games(Season(year), workers=args.workers, incremental=args.incremental)
+
+    touched = []  # seasons whose aggregates have to be refreshed.
+    with bulk_load() if bulk else contextlib.nullcontext():
+        if args.shards and (args.i or args.load):  # each season in its own database, merged at the end.
+            insert_sharded(list(reversed(range(first_season, last_season))), workers=args.workers, load=args.load)
+            touched.extend(range(first_season, last_season))
+
+        elif args.load:  # insert the staging files in the database, without parsing the pages again.
+            for year in reversed(range(first_season, last_season)):
+                season = Season(year)
+                if has_staging(season):
+                    n_games = load_games(season, read_staging(season), incremental=args.incremental)
+                else:
+                    n_games = insert_games(season, workers=args.workers, incremental=args.incremental)
+                if n_games:
+                    touched.append(year)
+
+        elif args.i:
+            # Extract and insert the information in the database.
+            for year in reversed(range(first_season, last_season)):
+                season = Season(year)
+                if insert_games(season, workers=args.workers, incremental=args.incremental):
+                    touched.append(year)
 
+    if args.i:
         # Update missing info about actors, teams and participants.
-        update_games()
+        # The corrections merge actors of any season, not only of the ones inserted now.
+        touched.extend(update_games(workers=args.workers, repair=args.repair))
+
+    if args.d or args.i:  # the pages that couldn't be downloaded are kept in the manifest until they are.
+        report_failures()
+
+    if args.aggregates:  # compute again the aggregates of every season, not only the inserted ones.
+        touched.extend(range(first_season, last_season))
+    refresh_aggregates(touched)
+
+    if args.snapshot:  # columnar copy of the database for the analysis (src/snapshot.py).
+        export_snapshot(DB_PATH)
+
+    if args.export:  # files to publish the dataset, only the seasons that changed with --incremental.
+        export_database(DB_PATH, export_format=args.export_format, incremental=args.incremental)
+
+    if args.pack:  # store the pages in compressed archives instead of thousands of small files.
+        pack_pages([Season(year) for year in range(first_season, last_season)])
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-r", action='store_true', default=False)
     parser.add_argument("-d", action='store_true', default=False)
     parser.add_argument("-i", action='store_true', default=False)
+    parser.add_argument("--extract", action='store_true', default=False)
+    parser.add_argument("--load", action='store_true', default=False)
+    parser.add_argument("--incremental", action='store_true', default=False)
+    parser.add_argument("--shards", action='store_true', default=False)  # only to fill a new database (-r).
+    parser.add_argument("--aggregates", action='store_true', default=False)
+    parser.add_argument("--snapshot", action='store_true', default=False)
+    parser.add_argument("--export", action='store_true', default=False)
+    parser.add_argument("--export-format", action='store', dest="export_format", default='csv', choices=list(FORMATS))
     parser.add_argument("--start", action='store', dest="first_season", default=1994, type=int)
     parser.add_argument("--end", action='store', dest="last_season", default=2016, type=int)
+    parser.add_argument("--base-url", action='store', dest="base_url", default=None)
+    parser.add_argument("--refresh", action='store_true', default=False)
+    parser.add_argument("--repair", action='store_true', default=False)
+    parser.add_argument("--pack", action='store_true', default=False)
+    parser.add_argument("--workers", action='store', dest="workers", default=8, type=int)
 
-    main(parser.parse_args())
\ No newline at end of file
+    args = parser.parse_args()
+    if args.shards and not args.r:
+        parser.error('--shards fills a new database, use it with -r')
+    main(args)
\ No newline at end of file
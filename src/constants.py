@@ -0,0 +1,43 @@
+"""
+Seasons and acbids of the games, without side effects: src.season creates the data folders when it is imported, and
+the replay server, the snapshot and the export are used without them.
+
+Each game has an unique id in acb.com (its acbid) with 5 digits: the first two are the code of the season (the oldest
+season, in 1956, has code 1) and the last three are the number of the game in the season.
+"""
+FIRST_SEASON = 1956
+
+
+def get_season_code(season):
+    """
+    :param season: int, e.g. 2016
+    :return: int, e.g. 61
+    """
+    return season - FIRST_SEASON + 1
+
+
+def get_season(acbid):
+    """
+    :param acbid: String, acbid of a game or only its first two digits.
+    :return: int, the season of the game.
+    """
+    return FIRST_SEASON - 1 + int(acbid[:2])
+
+
+def get_acbid(season, id_game_number):
+    """
+    :param season: int
+    :param id_game_number: int
+    :return: String
+    """
+    return str(get_season_code(season)).zfill(2) + str(id_game_number).zfill(3)
+
+
+def get_acbid_range(season):
+    """
+    First and last possible acbid of the games of a season, to find them with the index of the acbid.
+
+    :param season: int
+    :return: (String, String) tuple
+    """
+    return get_acbid(season, 0), get_acbid(season, 999)
@@ -1,5 +1,170 @@
-import urllib.request, os, logging
-from pyquery import PyQuery as pq
+import urllib.request, urllib.error, urllib.parse, http.client, os, logging, gzip, threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from src.pack import get_archive, locate
+from src.manifest import MANIFEST, HEAD_SIZE, page_error
+from src.scheduler import Scheduler
+
+SCAN_CHUNK_SIZE = 256  # files scanned by a process at once.
+
+Response = namedtuple('Response', ['url', 'status', 'content', 'etag', 'last_modified'])
+BadFile = namedtuple('BadFile', ['path', 'url', 'reason'])
+SanityReport = namedtuple('SanityReport', ['directory', 'checked', 'bad_files'])
+
+
+class SanityCheckError(Exception):
+    """
+    Some downloaded files are not valid. The report with the bad files is in the `report` attribute.
+    """
+    def __init__(self, report):
+        super().__init__('There are {} errors in the downloads of {}!'.format(len(report.bad_files),
+                                                                              report.directory))
+        self.report = report
+
+
+class DownloadSession:
+    """
+    HTTP session used for every download from acb.com.
+
+    It keeps one keep-alive connection per host and thread and asks for gzip-compressed pages. The requests go through
+    a scheduler that limits the rate, adapts the concurrency and retries the transient errors. The ETag/Last-Modified
+    validators of every url are kept in the manifest. When `revalidate` is set, the pages already downloaded are
+    requested again with conditional headers, so the unchanged ones are answered with a 304 and an empty body.
+    """
+    MAX_REDIRECTS = 5
+
+    def __init__(self, manifest=MANIFEST, scheduler=None, timeout=30, revalidate=False):
+        self.manifest = manifest
+        self.scheduler = scheduler or Scheduler()
+        self.timeout = timeout
+        self.revalidate = revalidate
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._revalidated = set()
+
+    def _get_connection(self, scheme, netloc, fresh=False):
+        """
+        Get the keep-alive connection of the current thread to a host.
+
+        :param scheme: String
+        :param netloc: String
+        :param fresh: bool, discard the existing connection.
+        :return: HTTPConnection
+        """
+        connections = self._local.__dict__.setdefault('connections', dict())
+        key = (scheme, netloc)
+        if fresh:
+            self._drop_connection(scheme, netloc)
+        if key not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def _drop_connection(self, scheme, netloc):
+        """
+        Close and forget the connection of the current thread to a host, e.g. after a timeout left it waiting for a
+        response that will never be read.
+
+        :param scheme: String
+        :param netloc: String
+        """
+        connection = self._local.__dict__.setdefault('connections', dict()).pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+    def _request(self, url, headers):
+        """
+        Send a GET request through a pooled connection, reconnecting once if the server closed it. After any other
+        error the connection is dropped, so the next request (or retry) of the thread opens a new one.
+
+        :param url: String
+        :param headers: dict
+        :return: status, response headers and raw body
+        """
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for attempt in range(2):
+            connection = self._get_connection(parts.scheme, parts.netloc, fresh=attempt > 0)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()  # the body must be fully read before reusing the connection.
+                break
+            except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError):
+                self._drop_connection(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+            except (OSError, http.client.HTTPException):  # including the timeouts.
+                self._drop_connection(parts.scheme, parts.netloc)
+                raise
+        return response.status, response.msg, body
+
+    def _follow(self, url, headers):
+        """
+        Send a GET request following the redirections.
+
+        :param url: String
+        :param headers: dict
+        :return: status, response headers and raw body
+        """
+        for _ in range(self.MAX_REDIRECTS + 1):
+            status, response_headers, body = self._request(url, headers)
+            if status in (301, 302, 303, 307, 308) and response_headers.get('Location'):
+                url = urllib.parse.urljoin(url, response_headers['Location'])
+                continue
+            break
+
+        if status >= 300 and status != 304:
+            raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ''), response_headers, None)
+        return status, response_headers, body
+
+    def fetch(self, url, conditional=False):
+        """
+        Request a URL.
+
+        :param url: String
+        :param conditional: bool, send the stored validators of the url.
+        :return: Response, with None content if the page has not changed.
+        """
+        if conditional and url in self._revalidated:  # already checked during this run.
+            return Response(url, 304, None, None, None)
+
+        headers = {'Accept-Encoding': 'gzip', 'Connection': 'keep-alive',
+                   'User-Agent': 'Python-urllib/' + urllib.request.__version__}
+        if conditional:
+            validators = self.manifest.validators(url)
+            if 'ETag' in validators:
+                headers['If-None-Match'] = validators['ETag']
+            if 'Last-Modified' in validators:
+                headers['If-Modified-Since'] = validators['Last-Modified']
+
+        status, response_headers, body = self.scheduler.call(url, lambda: self._follow(url, headers))
+
+        with self._lock:
+            self._revalidated.add(url)
+        if status == 304:
+            return Response(url, status, None, None, None)
+
+        if response_headers.get('Content-Encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        return Response(url, status, body.decode('utf-8'),
+                        response_headers.get('ETag'), response_headers.get('Last-Modified'))
+
+    def get(self, url):
+        """
+        Get data from URL.
+
+        :param url: String
+        :return: content of the page
+        """
+        return self.fetch(url).content
+
+
+SESSION = DownloadSession()
+
 
 def get_page(url):
     """
@@ -8,36 +173,176 @@ def get_page(url):
     :param url: String
     :return: content of the page
     """
-    return urllib.request.urlopen(url).read().decode('utf-8')
+    return SESSION.get(url)
 
 
 def save_content(file_path, content):
     """
-    Saves the content to a file in the path provided.
+    Saves the content to a file in the path provided. If the directory has been packed, the content is appended to
+    its archive instead.
 
     :param file_path: String
     :param content: String
     :return: content of the page
     """
-    with open(file_path, 'w') as file:
-        file.write(content)
+    directory, key = locate(file_path)
+    archive = get_archive(directory)
+    if archive is not None:
+        archive.write(key, content)
         return content
 
+    # Write to a temporary file first, an interrupted download must not leave a truncated page behind.
+    tmp_path = file_path + '.part'
+    with open(tmp_path, 'w') as file:
+        file.write(content)
+    os.replace(tmp_path, file_path)
+    return content
+
 
-def open_or_download(file_path, url):
+def is_stored(file_path):
     """
-    Open or download a file.
+    Checks if a file has been downloaded, either as a plain file or inside the archive of its directory.
+
+    :param file_path: String
+    :return: bool
+    """
+    if os.path.isfile(file_path):
+        return True
+    directory, key = locate(file_path)
+    archive = get_archive(directory)
+    return archive is not None and key in archive
+
+
+def read_content(file_path):
+    """
+    Read a downloaded file, either from disk or from the archive of its directory.
 
     :param file_path: String
-    :param url: String
     :return: content of the file.
     """
     if os.path.isfile(file_path):
         with open(file_path, 'r') as file:
             return file.read()
+    directory, key = locate(file_path)
+    archive = get_archive(directory)
+    if archive is None or key not in archive:
+        raise FileNotFoundError(file_path)
+    return archive.read(key)
+
+
+def stored_files(directory_name):
+    """
+    List the files downloaded in a directory, including the ones inside its archive.
+
+    :param directory_name: String
+    :return: list of file paths
+    """
+    filenames = set(os.listdir(directory_name)) if os.path.isdir(directory_name) else set()
+    filenames = {filename for filename in filenames if not filename.endswith('.part')}
+    archive = get_archive(directory_name)
+    if archive is not None:
+        filenames.update(key + '.html' for key in archive.keys())
+    return [os.path.join(directory_name, filename) for filename in sorted(filenames)]
+
+
+def open_or_download(file_path, url, force=False):
+    """
+    Open or download a file. Every download is recorded in the manifest.
+
+    :param file_path: String
+    :param url: String
+    :param force: bool, download the file even if it is already stored.
+    :return: content of the file.
+    """
+    if is_stored(file_path) and not force:
+        if SESSION.revalidate:
+            response = SESSION.fetch(url, conditional=True)
+            if response.content is None:
+                MANIFEST.touch(file_path, status=response.status)
+            else:  # the page has changed since it was downloaded.
+                save_content(file_path, response.content)
+                MANIFEST.record(file_path, response.content, url, response.status, response.etag,
+                                response.last_modified)
+                return response.content
+        return read_content(file_path)
     else:
-        html_file = get_page(url)
-        return save_content(file_path, html_file)
+        response = SESSION.fetch(url)
+        save_content(file_path, response.content)
+        MANIFEST.record(file_path, response.content, url, response.status, response.etag, response.last_modified)
+        return response.content
+
+
+def report_failures(logging_level=logging.INFO):
+    """
+    Log the pages whose download failed after all the retries (the dead letters of the scheduler), according to the
+    manifest. They stay there until a later request succeeds.
+
+    :param logging_level: logging object
+    :return: list of (path, url, error) tuples
+    """
+    logging.basicConfig(level=logging_level)
+    logger = logging.getLogger(__name__)
+
+    failures = MANIFEST.failures()
+    if failures:
+        logger.warning('{} pages could not be downloaded, they are requested again in the next run:'.format(
+            len(failures)))
+        for file_path, url, error in failures:
+            logger.warning('  {} ({}): {}'.format(file_path, url, error))
+    return failures
+
+
+def pending_downloads(file_paths):
+    """
+    Get the files that have to be requested to acb.com: the missing ones, the broken ones and, if the pages are being
+    revalidated, all of them. The manifest is queried once instead of checking every file.
+
+    :param file_paths: list of Strings
+    :return: list of Strings
+    """
+    if SESSION.revalidate:
+        return list(file_paths)
+
+    manifest_status = MANIFEST.status({os.path.dirname(os.path.normpath(file_path)) for file_path in file_paths})
+    pending = []
+    for file_path in file_paths:
+        valid = manifest_status.get(os.path.normpath(file_path))
+        if valid is None:  # not in the manifest, it might have been downloaded before the manifest existed.
+            if not is_stored(file_path):
+                pending.append(file_path)
+        elif not valid:
+            pending.append(file_path)
+    return pending
+
+
+def download_many(downloads, workers=1, force=False):
+    """
+    Open or download several files concurrently. A file that can't be downloaded after all the retries doesn't stop
+    the rest of downloads: it is logged and recorded in the manifest with its error (see report_failures), so it is
+    retried in the next run.
+
+    :param downloads: list of (file_path, url) tuples
+    :param workers: int, number of concurrent downloads
+    :param force: bool, download the files even if they are already stored.
+    :return: generator with the file paths, in the order their downloads finish
+    """
+    def download(file_path, url):
+        try:
+            open_or_download(file_path=file_path, url=url, force=force)
+        except Exception as error:
+            logging.getLogger(__name__).error('Giving up on {}: {}'.format(url, error))
+            MANIFEST.record_failure(file_path, url, getattr(error, 'code', None), repr(error))
+        return file_path
+
+    if workers <= 1:
+        for file_path, url in downloads:
+            yield download(file_path, url)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download, file_path, url) for file_path, url in downloads]
+        for future in as_completed(futures):
+            yield future.result()
 
 
 def validate_dir(folder):
@@ -50,26 +355,94 @@ def validate_dir(folder):
         os.mkdir(folder)
 
 
-def sanity_check(directory_name, logging_level=logging.INFO):
+def read_head(file_path, size=HEAD_SIZE):
+    """
+    Read only the first bytes of a downloaded file, either from disk or from the archive of its directory.
+
+    :param file_path: String
+    :param size: int
+    :return: bytes
+    """
+    if os.path.isfile(file_path):
+        with open(file_path, 'rb') as file:
+            return file.read(size)
+    directory, key = locate(file_path)
+    return get_archive(directory).read_head(key, size)
+
+
+def scan_file(file_path):
+    """
+    Look for the error markers in the head of a file, without parsing it.
+
+    :param file_path: String
+    :return: (path, size, error) tuple. The size is None for the pages inside an archive.
+    """
+    size = os.path.getsize(file_path) if os.path.isfile(file_path) else None
+    return file_path, size, page_error(read_head(file_path))
+
+
+def scan_files(file_paths, workers=None):
+    """
+    Scan several files across a pool of processes.
+
+    :param file_paths: list of Strings
+    :param workers: int, number of processes. By default the number of CPUs.
+    :return: list of (path, size, error) tuples
     """
-    Checks if thes file within a directoy have been correctly downloaded
+    if len(file_paths) < SCAN_CHUNK_SIZE or workers == 1:  # not worth starting the processes.
+        return list(map(scan_file, file_paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(scan_file, file_paths, chunksize=SCAN_CHUNK_SIZE))
+
+
+def _bad_files(directory_name):
+    """
+    Get the invalid files of a directory according to the manifest, with the reason why they are invalid.
+
+    :param directory_name: String
+    :return: list of BadFile
+    """
+    bad_files = []
+    for file_path, url in MANIFEST.invalid(directory_name):
+        reason = page_error(read_head(file_path)) if is_stored(file_path) else 'missing'
+        bad_files.append(BadFile(file_path, url, reason or 'invalid in the manifest'))
+    return bad_files
+
+
+def sanity_check(directory_name, logging_level=logging.INFO, verify=False, repair=False, workers=None):
+    """
+    Checks if thes file within a directoy have been correctly downloaded. The answer comes from the manifest, only the
+    files that are not recorded yet are scanned (and recorded). Only the head of the files is scanned.
 
     :param directory_name: String
     :param logging_level: logging object
+    :param verify: bool, scan all the files instead of trusting the manifest.
+    :param repair: bool, download again the bad files.
+    :param workers: int, number of processes scanning the files.
+    :return: SanityReport
     """
     logging.basicConfig(level=logging_level)
     logger = logging.getLogger(__name__)
 
-    errors = []
-    directory = os.fsencode(directory_name)
-    for file in os.listdir(directory):
-        with open(os.path.join(directory, file)) as f:
-            raw_html = f.read()
+    file_paths = stored_files(directory_name)
+    if verify:
+        to_scan = file_paths
+    else:
+        recorded = MANIFEST.status([directory_name])
+        to_scan = [file_path for file_path in file_paths if os.path.normpath(file_path) not in recorded]
+    MANIFEST.record_scans(scan_files(to_scan, workers))
 
-            doc = pq(raw_html)
-            if doc("title").text() == '404 Not Found':
-                errors.append(os.fsdecode(file))
+    bad_files = _bad_files(directory_name)
+    if repair and bad_files:
+        downloads = [(bad_file.path, bad_file.url) for bad_file in bad_files if bad_file.url]
+        logger.info('Downloading again {} bad files of {}...'.format(len(downloads), directory_name))
+        list(download_many(downloads, workers=workers or 8, force=True))
+        bad_files = _bad_files(directory_name)
 
-    if errors: raise Exception('There are {} errors in the downloads!'.format(len(errors)))
-    logger.info('Sanity check of {} correctly finished!\n'.format(os.fsdecode(directory)))
-    return errors
\ No newline at end of file
+    report = SanityReport(directory_name, len(file_paths), bad_files)
+    if bad_files:
+        for bad_file in bad_files:
+            logger.error('{}: {} ({})'.format(bad_file.path, bad_file.reason, bad_file.url))
+        raise SanityCheckError(report)
+    logger.info('Sanity check of {} correctly finished! ({} files)\n'.format(directory_name, len(file_paths)))
+    return report
@@ -0,0 +1,213 @@
+"""
+Export of the tables of the database to publish the dataset (Kaggle, data.world), as gzip CSV or Parquet files. The
+rows are streamed from SQLite in chunks of CHUNK_SIZE, so the memory doesn't depend on the size of the tables: each
+chunk is appended to the CSV file or written as a row group of the Parquet file.
+
+The games, participants and names of the teams are partitioned by season, e.g. export/game/season=2016.csv.gz, and the
+actors and teams are a single file, e.g. export/actor.csv.gz. The fingerprint of every season exported is kept in
+export/manifest.json, so an incremental export only writes the seasons that have changed since the last one.
+"""
+import os, csv, gzip, json, hashlib, sqlite3, datetime, logging, argparse
+from src.constants import get_season, get_acbid_range
+
+try:
+    import pyarrow, pyarrow.parquet
+except ImportError:  # only CSV can be exported.
+    pyarrow = None
+
+EXPORT_PATH = os.path.join('..', 'data', 'export')
+CHUNK_SIZE = 10000
+FORMATS = {'csv': '.csv.gz', 'parquet': '.parquet'}
+PARTITIONED_TABLES = {  # the query of a season, and the alias of the table in it.
+    'game': ('SELECT {columns} FROM game g WHERE g.acbid BETWEEN ? AND ? ORDER BY g.id', 'g'),
+    'participant': ('SELECT {columns} FROM game g JOIN participant p ON p.game_id = g.id '
+                    'WHERE g.acbid BETWEEN ? AND ? ORDER BY p.game_id, p.id', 'p'),
+    'teamName': ('SELECT {columns} FROM teamName t WHERE t.season = ? ORDER BY t.id', 't')}
+TABLES = ['team', 'actor']
+
+
+def _parameters(table, season):
+    return (season,) if table == 'teamName' else get_acbid_range(season)
+
+
+def _columns(connection, table):
+    """
+    :param connection: sqlite3 connection
+    :param table: String
+    :return: list of (name, declared type) tuples.
+    """
+    return [(row[1], row[2].upper()) for row in connection.execute('PRAGMA table_info({})'.format(table))]
+
+
+def _stream(connection, query, parameters=()):
+    """
+    Iterate over the rows of a query in chunks, without fetching all of them.
+
+    :param connection: sqlite3 connection
+    :param query: String
+    :param parameters: tuple
+    :return: iterator of lists of rows.
+    """
+    cursor = connection.execute(query, parameters)
+    while True:
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        if not rows:
+            break
+        yield rows
+
+
+def _write_csv(path, columns, chunks):
+    with gzip.open(path, 'wt', compresslevel=6, encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([column for column, _ in columns])
+        for rows in chunks:
+            writer.writerows(rows)
+
+
+def _arrow_value(value, declared_type):
+    """
+    Convert a value of SQLite into the type of its Parquet column. A value that doesn't fit (e.g. a stat of acb with
+    text instead of a number) is exported as null.
+    """
+    if value is None:
+        return None
+    try:
+        if declared_type == 'TEXT':
+            return str(value)
+        if declared_type == 'TIMESTAMP':
+            return datetime.datetime.strptime(str(value)[:19], '%Y-%m-%d %H:%M:%S')
+        if declared_type == 'BOOLEAN':
+            return bool(value)
+        if declared_type == 'REAL':
+            return float(value)
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _write_parquet(path, columns, chunks):
+    if pyarrow is None:
+        raise ImportError('pyarrow is required to export Parquet files, please install it')
+
+    types = {'INTEGER': pyarrow.int64(), 'BOOLEAN': pyarrow.bool_(), 'REAL': pyarrow.float64(),
+             'TIMESTAMP': pyarrow.timestamp('s')}
+    schema = pyarrow.schema([(column, types.get(declared_type, pyarrow.string())) for column, declared_type in columns])
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for rows in chunks:  # a row group per chunk.
+            arrays = [[_arrow_value(row[cont], declared_type) for row in rows]
+                      for cont, (_, declared_type) in enumerate(columns)]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+
+def _export_query(connection, path, columns, query, parameters, export_format):
+    """
+    Write the rows of a query into a file, which replaces the previous one once it is complete.
+    """
+    tmp_path = path + '.part'
+    write = _write_csv if export_format == 'csv' else _write_parquet
+    write(tmp_path, columns, _stream(connection, query, parameters))
+    os.replace(tmp_path, path)
+
+
+def season_fingerprint(connection, season):
+    """
+    Fingerprint of the content of a season: the games with the hash of their pages and scores, and every column of
+    the participants in the order they are exported, so it changes if they are inserted again, corrected (e.g. an
+    actor merged into another) or swapped.
+
+    :param connection: sqlite3 connection
+    :param season: int
+    :return: String
+    """
+    acbid_range = get_acbid_range(season)
+    participant_query, alias = PARTITIONED_TABLES['participant']
+    participant_columns = ', '.join('{}.{}'.format(alias, name) for name, _ in _columns(connection, 'participant'))
+    fingerprint = hashlib.sha1()
+    for query in ['SELECT id, acbid, page_sha1, team_home_id, team_away_id, competition_phase, round_phase, '
+                  'score_home, score_away FROM game g WHERE g.acbid BETWEEN ? AND ? ORDER BY g.id',
+                  participant_query.format(columns=participant_columns)]:
+        for row in connection.execute(query, acbid_range):
+            fingerprint.update(repr(row).encode('utf-8'))
+    for row in connection.execute('SELECT id, team_id, name FROM teamName WHERE season = ? ORDER BY id', (season,)):
+        fingerprint.update(repr(row).encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+def export_database(db_path, export_path=EXPORT_PATH, export_format='csv', seasons=None, incremental=False,
+                    logging_level=logging.INFO):
+    """
+    Export the tables of a database.
+
+    :param db_path: String
+    :param export_path: String
+    :param export_format: String, 'csv' or 'parquet'.
+    :param seasons: list of int, the seasons to export. All the seasons in the database by default.
+    :param incremental: bool, only export the seasons that have changed since the last export.
+    :param logging_level: logging object
+    :return: list of int, the seasons exported.
+    """
+    logging.basicConfig(level=logging_level)
+    logger = logging.getLogger(__name__)
+
+    if export_format not in FORMATS:
+        raise ValueError('Unknown format {}, expected one of {}'.format(export_format, list(FORMATS)))
+    extension = FORMATS[export_format]
+
+    manifest_path = os.path.join(export_path, 'manifest.json')
+    manifest = {'format': export_format, 'seasons': dict()}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            previous = json.load(file)
+        if previous['format'] == export_format:
+            manifest = previous
+
+    connection = sqlite3.connect('file:{}?mode=ro'.format(db_path), uri=True)
+    try:
+        if seasons is None:
+            seasons = [get_season(row[0]) for row in connection.execute(
+                'SELECT DISTINCT substr(acbid, 1, 2) FROM game ORDER BY 1')]
+
+        fingerprints = {season: season_fingerprint(connection, season) for season in seasons}
+        if incremental:
+            seasons = [season for season in seasons if manifest['seasons'].get(str(season)) != fingerprints[season]]
+        logger.info('Exporting {} seasons into {}...'.format(len(seasons), export_path))
+
+        for table in TABLES:  # small enough to be exported every time.
+            os.makedirs(export_path, exist_ok=True)
+            columns = _columns(connection, table)
+            _export_query(connection, os.path.join(export_path, table + extension), columns,
+                          'SELECT {} FROM {} ORDER BY id'.format(', '.join(column for column, _ in columns), table),
+                          (), export_format)
+
+        for table, (query, alias) in PARTITIONED_TABLES.items():
+            os.makedirs(os.path.join(export_path, table), exist_ok=True)
+            columns = _columns(connection, table)
+            query = query.format(columns=', '.join('{}.{}'.format(alias, column) for column, _ in columns))
+            for season in seasons:
+                _export_query(connection, os.path.join(export_path, table, 'season={}{}'.format(season, extension)),
+                              columns, query, _parameters(table, season), export_format)
+
+        for season in seasons:
+            manifest['seasons'][str(season)] = fingerprints[season]
+    finally:
+        connection.close()
+
+    tmp_path = manifest_path + '.part'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+    logger.info('Export finished!')
+    return seasons
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", action='store', dest="database",
+                        default=os.path.join(os.path.dirname(__file__), '..', 'data', 'database.db'))
+    parser.add_argument("--output", action='store', dest="output", default=EXPORT_PATH)
+    parser.add_argument("--format", action='store', dest="format", default='csv', choices=list(FORMATS))
+    parser.add_argument("--incremental", action='store_true', default=False)
+    args = parser.parse_args()
+
+    export_database(args.database, args.output, export_format=args.format, incremental=args.incremental)
@@ -0,0 +1,157 @@
+import re
+from lxml import etree
+
+"""
+Same selections as the CSS selectors we used with pyquery (e.g. '.estverde'), compiled only once.
+"""
+BY_CLASS = etree.XPath("descendant-or-self::*[contains(concat(' ', normalize-space(@class), ' '), "
+                       "concat(' ', $name, ' '))]")
+TDS_BY_CLASS = etree.XPath("descendant-or-self::*[contains(concat(' ', normalize-space(@class), ' '), "
+                           "concat(' ', $name, ' '))]/descendant-or-self::td")
+ROWS = etree.XPath("descendant-or-self::tr")
+TEAM_NAME_RE = re.compile("(.*) [0-9]")
+HTML_PARSER = etree.HTMLParser()  # plain elements, lxml.html's element classes are much slower to walk.
+
+"""
+Whitespace and inline elements as pyquery's text() treats them: the text of an inline element joins the text around
+it, any other element is in a line of its own, and <br> is always a line break.
+"""
+WHITESPACE_RE = re.compile('[\x20\x09\x0C\u200B\x0A\x0D]+')
+INLINE_TAGS = {'a', 'abbr', 'acronym', 'b', 'bdo', 'big', 'br', 'button', 'cite', 'code', 'dfn', 'em', 'i', 'img',
+               'input', 'kbd', 'label', 'map', 'object', 'q', 'samp', 'script', 'select', 'small', 'span', 'strong',
+               'sub', 'sup', 'textarea', 'time', 'tt', 'var'}
+BLOCK_BREAK, LINE_BREAK = None, True
+
+
+def _text_parts(element, parts):
+    """
+    Add the texts of an element and its descendants to parts, with a break around the elements that aren't inline.
+
+    :param element: lxml element
+    :param parts: list of Strings and breaks (BLOCK_BREAK, LINE_BREAK).
+    """
+    if element.tag == 'br':
+        parts.append(LINE_BREAK)
+    elif element.tag not in INLINE_TAGS:
+        parts.append(BLOCK_BREAK)
+    if element.text is not None:
+        parts.append(element.text)
+    for child in element:
+        if isinstance(child.tag, str):  # comments and processing instructions don't have text.
+            _text_parts(child, parts)
+        if child.tail is not None:
+            parts.append(child.tail)
+    if element.tag not in INLINE_TAGS:
+        parts.append(BLOCK_BREAK)
+
+
+def text(element):
+    """
+    Text of an element, exactly as pyquery's text() returns it.
+
+    :param element: lxml element, or None.
+    :return: String
+    """
+    if element is None:
+        return ''
+    if not len(element):  # most of the cells only have text, we don't need to walk them.
+        return WHITESPACE_RE.sub(' ', element.text or '').strip()
+
+    parts = []
+    _text_parts(element, parts)
+    lines = []
+    texts = []
+    for part in parts + [BLOCK_BREAK]:
+        if isinstance(part, str):
+            texts.append(part)
+            continue
+        line = WHITESPACE_RE.sub(' ', ''.join(texts)).strip()
+        texts = []
+        if line:
+            lines.append(line)
+        if part is BLOCK_BREAK and lines and lines[-1] is BLOCK_BREAK:  # consecutive blocks only break once.
+            continue
+        lines.append(part)
+    indexes = [i for i, line in enumerate(lines) if isinstance(line, str)]
+    if not indexes:
+        return ''
+    return ''.join(line if isinstance(line, str) else '\n' for line in lines[indexes[0]:indexes[-1] + 1])
+
+
+def has_class(element, name):
+    """
+    Checks if an element, or any of its descendants, has a class.
+
+    :param element: lxml element
+    :param name: String
+    :return: bool
+    """
+    if not len(element):
+        return name in (element.get('class') or '').split()
+    for descendant in element.iter(etree.Element):
+        if name in (descendant.get('class') or '').split():
+            return True
+    return False
+
+
+def extract_cells(tr):
+    """
+    Cells of a row of the players' table.
+
+    :param tr: lxml element
+    :return: list of (text, href, is_starter) tuples.
+    """
+    cells = []
+    for td in tr.iter('td'):
+        if not len(td):  # the cells of the stats, only text.
+            cells.append((WHITESPACE_RE.sub(' ', td.text or '').strip(), None,
+                          'gristit' in (td.get('class') or '').split()))
+            continue
+        link = next(td.iter('a'), None)
+        cells.append((text(td), link.get('href') if link is not None else None, has_class(td, 'gristit')))
+    return cells
+
+
+def extract_game(raw_game, table_class):
+    """
+    Extract the data of a game from its page in acb.com (stspartido.php).
+
+    :param raw_game: String
+    :param table_class: String, class of the statistics tables ('estadisticas' or 'estadisticasnew').
+    :return: tuple with the team_names, schedule, quarter_scores, referees, header and rows of GamePage.
+    """
+    doc = etree.fromstring(raw_game, HTML_PARSER)
+    tables = BY_CLASS(doc, name=table_class)
+    info_game_data, info_players_data = tables[0], tables[1]
+
+    teams_data = BY_CLASS(info_players_data, name='estverde')
+    team_names = []
+    for i in [0, 2]:
+        team_data = text(next(teams_data[i].iter('td'), None))
+        team_names.append(TEAM_NAME_RE.search(team_data).groups()[0])
+
+    scheduling_data = text(next(iter(TDS_BY_CLASS(info_game_data, name='estnegro')), None))
+    schedule = tuple(map(lambda x: x.strip(), scheduling_data.split("|")))  # Remove extra spaces.
+
+    quarters_data = TDS_BY_CLASS(info_game_data, name='estnaranja')
+    quarter_scores = [text(quarters_data[i]) if i < len(quarters_data) else '' for i in range(2, 7)]
+
+    referees_data = text(quarters_data[0]) if quarters_data else ''
+    referees = []
+    if referees_data:
+        referees = referees_data.split(":")[1].strip().split(",")
+        referees = list(filter(None, referees))
+        referees = list(map(lambda x: x.strip(), referees))
+
+    rows_data = ROWS(info_players_data)
+    header = [text(td) for td in rows_data[1].iter('td')] if len(rows_data) > 1 else []
+
+    rows = []
+    for tr in rows_data:
+        if has_class(tr, 'estverde'):  # header
+            if has_class(tr, 'estverdel'):  # team information
+                rows.append((True, []))
+        else:  # players, equipo, and coach.
+            rows.append((False, extract_cells(tr)))
+
+    return team_names, schedule, quarter_scores, referees, header, rows
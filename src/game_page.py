@@ -0,0 +1,45 @@
+import re
+from src.extractor import extract_game
+
+
+class GamePage:
+    """
+    Page of a game in acb.com (stspartido.php), parsed only once with the extractor in src.extractor.
+
+    It exposes the parts of the page as plain Python values, so the models don't need to parse the page again:
+
+     - team_names: names of the home and away teams.
+     - schedule: journey, date, time, venue and attendance.
+     - quarter_scores: text of the score of each quarter and the extra time, e.g. '20|18'.
+     - referees: names of the referees.
+     - header: ids of the stats of the players' table.
+     - rows: rows of the players' table, as (is_team_row, cells) tuples, where each cell is a (text, href, is_starter)
+       tuple. The team rows mark the start of the players of a team. The headers of the stats are skipped.
+    """
+    def __init__(self, raw_game):
+        self.raw_game = raw_game
+
+        """
+        There are two different statistics table in acb.com.
+        I assume they created the new one to introduce the +/- stat.
+        """
+        self.estadisticas_tag = '.estadisticasnew' if re.search(r'<table class="estadisticasnew"',
+                                                                raw_game) else '.estadisticas'
+        self.is_blank = self._is_blank(raw_game)
+        if self.is_blank:
+            return
+
+        (self.team_names, self.schedule, self.quarter_scores, self.referees, self.header,
+         self.rows) = extract_game(raw_game, self.estadisticas_tag[1:])
+
+    @staticmethod
+    def _is_blank(raw_game):
+        """
+        A playoff game might be blank if the series ends before the last game.
+
+        :param raw_game: String
+        :return: bool
+        """
+        return bool(re.search(r'<title>ACB.COM</title>', raw_game)
+                    and (re.search(r'"estverdel"> <', raw_game)
+                         or re.search(r'<font style="font-size : 12pt;">0 |', raw_game)))
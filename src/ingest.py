@@ -0,0 +1,80 @@
+import os, hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from src.download import read_content
+from src.game_page import GamePage
+from models.game import Game
+from models.participant import Participant
+
+"""
+Everything a worker extracts from the page of a game, as plain values and slotted records (src/records.py), so it can
+be sent back to the process that writes in the database. `game` is None if the page is blank, and `sha1` is the hash
+of the page.
+"""
+GameRecord = namedtuple('GameRecord', ['id_game_number', 'team_names', 'game', 'participants', 'scores', 'referees',
+                                       'sha1'])
+
+PARSE_CHUNK_SIZE = 8
+
+
+def parse_game(task):
+    """
+    Read and parse the page of a game, without accessing the database.
+
+    :param task: (file_path, id_game_number, acbid, known_sha1) tuple, where known_sha1 is the hash of the page
+    the last time it was parsed, if any.
+    :return: GameRecord, or None if the page hasn't changed.
+    """
+    file_path, id_game_number, acbid, known_sha1 = task
+    content = read_content(file_path)
+    sha1 = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    if sha1 == known_sha1:
+        return None
+
+    game_page = GamePage(content)
+    if game_page.is_blank:
+        return GameRecord(id_game_number, None, None, None, None, None, sha1)
+
+    participants, scores = Participant.extract_data(game_page, acbid)
+    return GameRecord(id_game_number, game_page.team_names, Game.extract_data(game_page, acbid), participants,
+                      scores, Participant.extract_referees(game_page), sha1)
+
+
+def parse_games(season, workers=1, known_hashes=None):
+    """
+    Parse the pages of the games of a season in a pool of `workers` processes, since parsing is bound by the CPU.
+
+    :param season: Season
+    :param workers: int
+    :param known_hashes: dict {id_game_number: sha1} of the pages already parsed. They are skipped if they haven't
+    changed.
+    :return: iterator of GameRecords (None for the pages skipped), in the order of the games.
+    """
+    known_hashes = known_hashes or dict()
+    tasks = [(os.path.join(season.GAMES_PATH, str(id_game_number) + '.html'), id_game_number,
+              Game.get_acbid(season, id_game_number), known_hashes.get(id_game_number))
+             for id_game_number in range(1, season.get_number_games() + 1)]
+
+    if workers <= 1:
+        yield from map(parse_game, tasks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(parse_game, tasks, chunksize=PARSE_CHUNK_SIZE)
+
+
+def parse_files(parse, file_paths, workers=1):
+    """
+    Parse several stored pages (e.g. of the actors or teams) across a pool of `workers` processes. As with the games,
+    it must be called outside of a transaction, the processes are forked with the connection to the database.
+
+    :param parse: function that takes the path of a file. It must be picklable, e.g. a module function or a
+    staticmethod.
+    :param file_paths: list of Strings
+    :param workers: int, number of processes.
+    :return: list with the result of each file, in the same order.
+    """
+    if len(file_paths) < PARSE_CHUNK_SIZE or workers <= 1:  # not worth starting the processes.
+        return list(map(parse, file_paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse, file_paths, chunksize=PARSE_CHUNK_SIZE))
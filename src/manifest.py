@@ -0,0 +1,191 @@
+import os, re, sqlite3, hashlib, datetime, threading
+
+MANIFEST_PATH = os.path.join('..', 'data', 'manifest.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page (
+    path TEXT PRIMARY KEY,  -- local path of the page, even if it is stored inside an archive.
+    directory TEXT NOT NULL,
+    url TEXT,  -- NULL for pages downloaded before the manifest existed.
+    size INTEGER,  -- In bytes.
+    sha1 TEXT,
+    status INTEGER,  -- HTTP status of the last response.
+    fetched_at TIMESTAMP,
+    valid BOOLEAN,  -- False if acb.com answered with an error page.
+    etag TEXT,
+    last_modified TEXT,
+    error TEXT  -- the error of the last request if it failed after all the retries (a dead letter), NULL otherwise.
+);
+CREATE INDEX IF NOT EXISTS page_directory_valid_idx ON page(directory, valid);
+CREATE INDEX IF NOT EXISTS page_url_idx ON page(url);
+"""
+
+COLUMNS = ['path', 'directory', 'url', 'size', 'sha1', 'status', 'fetched_at', 'valid', 'etag', 'last_modified',
+           'error']
+HEAD_SIZE = 4096  # the error markers are always in the <head> of the page.
+ERROR_MARKERS_RE = re.compile(rb'<title>\s*(404 Not Found|403 Forbidden|50[0-9] [A-Za-z ]+)\s*</title>',
+                              re.IGNORECASE)
+
+
+def page_error(head):
+    """
+    Look for the error markers of acb.com in the beginning of a page.
+
+    :param head: bytes, first HEAD_SIZE bytes of the page.
+    :return: String with the error, or None if the page is fine.
+    """
+    if not head.strip():
+        return 'empty page'
+    match = ERROR_MARKERS_RE.search(head)
+    return match.group(1).decode() if match else None
+
+
+def is_valid_page(content):
+    """
+    Checks if a page is not an error page of acb.com.
+
+    :param content: String
+    :return: bool
+    """
+    return page_error(content[:HEAD_SIZE].encode('utf-8')) is None
+
+
+class Manifest:
+    """
+    Persistent index of the downloaded pages.
+
+    It records, for every page, where it comes from, where it is stored, its size and hash, the last HTTP response
+    and whether it is valid. Every record is written in its own transaction, right after the page has been stored.
+    """
+    def __init__(self, manifest_path=MANIFEST_PATH):
+        self.manifest_path = manifest_path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(self.manifest_path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.executescript(SCHEMA)
+            # A manifest created by a previous version lacks the error of the pages.
+            if 'error' not in {row[1] for row in self._connection.execute('PRAGMA table_info(page)')}:
+                self._connection.execute('ALTER TABLE page ADD COLUMN error TEXT')
+        return self._connection
+
+    def record(self, file_path, content, url=None, status=200, etag=None, last_modified=None):
+        """
+        Record a page that has just been stored.
+
+        :param file_path: String
+        :param content: String
+        :param url: String
+        :param status: int
+        :param etag: String
+        :param last_modified: String
+        """
+        data = content.encode('utf-8')
+        file_path = os.path.normpath(file_path)
+        row = (file_path, os.path.dirname(file_path), url, len(data), hashlib.sha1(data).hexdigest(), status,
+               datetime.datetime.utcnow().isoformat(), is_valid_page(content), etag, last_modified, None)
+        with self._lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO page ({}) VALUES ({})'.format(
+                ', '.join(COLUMNS), ', '.join('?' for _ in COLUMNS)), row)
+
+    def record_scans(self, scans):
+        """
+        Record the result of scanning the head of some pages. Pages already recorded keep their url and hash.
+
+        :param scans: list of (path, size, error) tuples
+        """
+        rows = [(os.path.normpath(file_path), os.path.dirname(os.path.normpath(file_path)), size, error is None)
+                for file_path, size, error in scans]
+        with self._lock, self.connection:
+            self.connection.executemany('INSERT INTO page (path, directory, size, valid) VALUES (?, ?, ?, ?) '
+                                        'ON CONFLICT(path) DO UPDATE SET valid = excluded.valid, '
+                                        'size = COALESCE(excluded.size, size)', rows)
+
+    def record_failure(self, file_path, url, status=None, error=None):
+        """
+        Record a page that couldn't be downloaded, with its error. A page that wasn't stored is invalid, so it is
+        requested again in the next run, and a page that was already stored keeps its validity.
+
+        :param file_path: String
+        :param url: String
+        :param status: int, HTTP status if the server answered.
+        :param error: String, e.g. the repr of the exception.
+        """
+        file_path = os.path.normpath(file_path)
+        row = (file_path, os.path.dirname(file_path), url, status, datetime.datetime.utcnow().isoformat(), False,
+               error or 'unknown error')
+        with self._lock, self.connection:
+            self.connection.execute('INSERT INTO page (path, directory, url, status, fetched_at, valid, error) '
+                                    'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET '
+                                    'url = excluded.url, status = excluded.status, fetched_at = excluded.fetched_at, '
+                                    'error = excluded.error', row)
+
+    def touch(self, file_path, status=304):
+        """
+        Record that a page has been checked against acb.com and it hasn't changed.
+
+        :param file_path: String
+        :param status: int
+        """
+        with self._lock, self.connection:
+            self.connection.execute('UPDATE page SET status = ?, fetched_at = ?, error = NULL WHERE path = ?',
+                                    (status, datetime.datetime.utcnow().isoformat(), os.path.normpath(file_path)))
+
+    def validators(self, url):
+        """
+        Get the ETag and Last-Modified of the last response of a url. A broken page has no validators, so it is
+        downloaded again instead of being answered with a 304.
+
+        :param url: String
+        :return: dict
+        """
+        with self._lock:
+            row = self.connection.execute('SELECT etag, last_modified FROM page WHERE url = ? AND valid',
+                                          (url,)).fetchone()
+        if row is None:
+            return dict()
+        return {key: value for key, value in zip(('ETag', 'Last-Modified'), row) if value}
+
+    def status(self, directories):
+        """
+        Get the validity flag of the pages recorded in some directories.
+
+        :param directories: list of Strings
+        :return: dict {path: valid}
+        """
+        status = dict()
+        with self._lock:
+            for directory in directories:
+                rows = self.connection.execute('SELECT path, valid FROM page WHERE directory = ?',
+                                               (os.path.normpath(directory),))
+                status.update((path, bool(valid)) for path, valid in rows)
+        return status
+
+    def failures(self):
+        """
+        Get the pages whose last request failed after all the retries, in this run or in a previous one.
+
+        :return: list of (path, url, error) tuples
+        """
+        with self._lock:
+            return self.connection.execute('SELECT path, url, error FROM page WHERE error IS NOT NULL '
+                                           'ORDER BY path').fetchall()
+
+    def invalid(self, directory):
+        """
+        Get the pages of a directory that are not valid.
+
+        :param directory: String
+        :return: list of (path, url) tuples
+        """
+        with self._lock:
+            return self.connection.execute('SELECT path, url FROM page WHERE directory = ? AND NOT valid ORDER BY path',
+                                           (os.path.normpath(directory),)).fetchall()
+
+
+MANIFEST = Manifest()
@@ -0,0 +1,268 @@
+import os, io, glob, zlib, threading
+
+try:
+    import zstandard
+except ImportError:  # zlib with a preset dictionary is used instead.
+    zstandard = None
+
+MAGIC = b'ACBPACK'
+ZSTD_DICT_SIZE = 112640  # default size of the zstd trained dictionaries.
+ZLIB_DICT_SIZE = 32768  # zlib can't look back further than 32KB.
+TRAINING_SAMPLES = 1000
+
+_archives = dict()
+_archives_lock = threading.Lock()
+
+
+class PackArchive:
+    """
+    Compressed archive of the pages of a directory, e.g. ../data/2016/games -> ../data/2016/games.pack
+
+    Every page is compressed on its own with a dictionary trained on the acb.com boilerplate, hence a single page
+    can be read at random by its key (the game number or the acbid) through the offset index. The archive is made of:
+
+     - <directory>.pack: header with the codec and the compressed pages, one after another.
+     - <directory>.idx: append-only index with a 'key offset length' line per page.
+     - <directory>.dict: compression dictionary.
+
+    A page written again is appended, and the previous version stays in the archive until it is compacted.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.pack_path = directory + '.pack'
+        self.index_path = directory + '.idx'
+        self.dict_path = directory + '.dict'
+        self._lock = threading.Lock()
+        self._recover()
+
+        with open(self.pack_path, 'rb') as file:
+            magic, codec = file.readline().split()
+        if magic != MAGIC:
+            raise ValueError('{} is not a pack archive'.format(self.pack_path))
+        self.codec = codec.decode()
+        if self.codec == 'zstd' and zstandard is None:
+            raise ImportError('{} was compressed with zstd, please install zstandard'.format(self.pack_path))
+
+        with open(self.dict_path, 'rb') as file:
+            self.dictionary = file.read()
+
+        self.index, self.entries = self._read_index()
+        self._fd = os.open(self.pack_path, os.O_RDONLY)
+
+    def _recover(self):
+        """
+        Finish or undo a compaction that was interrupted: the new pack replaces the old one before the new index does.
+        """
+        if os.path.exists(self.pack_path + '.part'):  # the old pack and index are still there.
+            os.remove(self.pack_path + '.part')
+            if os.path.exists(self.index_path + '.part'):
+                os.remove(self.index_path + '.part')
+        elif os.path.exists(self.index_path + '.part'):  # the new pack is there, but not its index.
+            os.replace(self.index_path + '.part', self.index_path)
+
+    def _read_index(self):
+        """
+        :return: dict {key: (offset, length)} and the number of entries of the index, superseded ones included.
+        """
+        index = dict()
+        entries = 0
+        with open(self.index_path, 'r') as file:
+            for line in file:
+                key, offset, length = line.split()
+                index[key] = (int(offset), int(length))  # a page written twice keeps the last version.
+                entries += 1
+        return index, entries
+
+    @staticmethod
+    def exists(directory):
+        return os.path.isfile(directory + '.pack')
+
+    @staticmethod
+    def create(directory, samples, codec=None):
+        """
+        Create an empty archive with a dictionary made from some sample pages (trained with zstd).
+
+        :param directory: String
+        :param samples: list of bytes
+        :param codec: String, 'zstd' or 'zlib'. By default zstd if it is installed.
+        :return: PackArchive
+        """
+        codec = codec or ('zstd' if zstandard is not None else 'zlib')
+        if codec == 'zstd':
+            try:
+                dictionary = zstandard.train_dictionary(ZSTD_DICT_SIZE, samples).as_bytes()
+            except zstandard.ZstdError:  # not enough samples to train a dictionary.
+                dictionary = b''
+        else:
+            # zlib can't train a dictionary: the fallback is the end of the last samples, one after another. A
+            # dictionary with only the strings that are common to the samples (the HTML of the page) compresses worse
+            # than whole pages, since the names of the teams and players also repeat from a game to another.
+            dictionary = b''.join(samples)[-ZLIB_DICT_SIZE:]
+
+        with open(directory + '.dict', 'wb') as file:
+            file.write(dictionary)
+        with open(directory + '.idx', 'w'):
+            pass
+        with open(directory + '.pack', 'wb') as file:
+            file.write(MAGIC + b' ' + codec.encode() + b'\n')
+        return PackArchive(directory)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return list(self.index.keys())
+
+    def _compress(self, data):
+        if self.codec == 'zstd':
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            return zstandard.ZstdCompressor(level=19, dict_data=dict_data).compress(data)
+        compressor = zlib.compressobj(level=9, zdict=self.dictionary) if self.dictionary else zlib.compressobj(9)
+        return compressor.compress(data) + compressor.flush()
+
+    def _decompress(self, data):
+        if self.codec == 'zstd':
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+        decompressor = zlib.decompressobj(zdict=self.dictionary) if self.dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def read(self, key):
+        """
+        Read a page of the archive.
+
+        :param key: String
+        :return: content of the page
+        """
+        offset, length = self.index[key]
+        return self._decompress(os.pread(self._fd, length, offset)).decode('utf-8')
+
+    def read_head(self, key, size):
+        """
+        Decompress only the beginning of a page of the archive.
+
+        :param key: String
+        :param size: int, number of bytes
+        :return: bytes
+        """
+        offset, length = self.index[key]
+        data = os.pread(self._fd, length, offset)
+        if self.codec == 'zstd':
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            return zstandard.ZstdDecompressor(dict_data=dict_data).stream_reader(io.BytesIO(data)).read(size)
+        decompressor = zlib.decompressobj(zdict=self.dictionary) if self.dictionary else zlib.decompressobj()
+        return decompressor.decompress(data, size)
+
+    def write(self, key, content):
+        """
+        Append a page to the archive.
+
+        :param key: String
+        :param content: String
+        """
+        data = self._compress(content.encode('utf-8'))
+        with self._lock:
+            with open(self.pack_path, 'ab') as file:
+                offset = file.seek(0, os.SEEK_END)
+                file.write(data)
+            # The index line is written after the data, so a crash never leaves an entry pointing to nothing.
+            with open(self.index_path, 'a') as file:
+                file.write('{} {} {}\n'.format(key, offset, len(data)))
+            self.index[key] = (offset, len(data))
+            self.entries += 1
+
+    @property
+    def superseded(self):
+        """
+        :return: int, number of old versions of pages that are still in the archive.
+        """
+        return self.entries - len(self.index)
+
+    def compact(self):
+        """
+        Rewrite the archive with only the last version of every page. The compressed pages are copied as they are.
+        """
+        with self._lock:
+            with open(self.pack_path, 'rb') as file:
+                header = file.readline()
+            index = dict()
+            with open(self.pack_path + '.part', 'wb') as file:
+                file.write(header)
+                for key, (offset, length) in sorted(self.index.items(), key=lambda item: item[1][0]):
+                    index[key] = (file.tell(), length)
+                    file.write(os.pread(self._fd, length, offset))
+                file.flush()
+                os.fsync(file.fileno())
+            with open(self.index_path + '.part', 'w') as file:
+                for key, (offset, length) in index.items():
+                    file.write('{} {} {}\n'.format(key, offset, length))
+                file.flush()
+                os.fsync(file.fileno())
+
+            os.replace(self.pack_path + '.part', self.pack_path)
+            os.replace(self.index_path + '.part', self.index_path)
+            old_fd = self._fd
+            self.index, self.entries, self._fd = index, len(index), os.open(self.pack_path, os.O_RDONLY)
+            os.close(old_fd)
+
+
+def get_archive(directory):
+    """
+    Get the archive of a directory, if it has been packed.
+
+    :param directory: String
+    :return: PackArchive or None
+    """
+    directory = os.path.normpath(directory)
+    with _archives_lock:
+        if directory not in _archives and PackArchive.exists(directory):
+            _archives[directory] = PackArchive(directory)
+        return _archives.get(directory)
+
+
+def locate(file_path):
+    """
+    Get the directory and the key of a page inside an archive.
+
+    :param file_path: String
+    :return: directory and key
+    """
+    directory, filename = os.path.split(file_path)
+    return directory, os.path.splitext(filename)[0]
+
+
+def pack_directory(directory, codec=None):
+    """
+    Move the downloaded pages of a directory into its archive, creating it if needed, and drop the old versions of the
+    pages that have been written again.
+
+    :param directory: String
+    :param codec: String
+    :return: number of packed pages
+    """
+    filenames = sorted(glob.glob(os.path.join(directory, '*.html')))
+    archive = get_archive(directory)
+    if not filenames:
+        if archive is not None and archive.superseded:
+            archive.compact()
+        return 0
+
+    if archive is None:
+        samples = []
+        for filename in filenames[:TRAINING_SAMPLES]:
+            with open(filename, 'rb') as file:
+                samples.append(file.read())
+        PackArchive.create(directory, samples, codec=codec)
+        archive = get_archive(directory)
+
+    for filename in filenames:
+        with open(filename, 'r') as file:
+            archive.write(locate(filename)[1], file.read())
+    for filename in filenames:  # only removed once every page is in the archive.
+        os.remove(filename)
+    if archive.superseded:
+        archive.compact()
+    return len(filenames)
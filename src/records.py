@@ -0,0 +1,109 @@
+"""
+The records of a game, from the parsing of its page to the insert in the database: the game itself, the stat line of
+every participant and the referees. They have __slots__ instead of a __dict__, since a season has thousands of them: a
+few hundred bytes less per record and they are converted to the parameters of the inserts without building a dict or
+a model instance.
+"""
+STAT_FIELDS = ['display_name', 'first_name', 'last_name', 'number', 'is_coach', 'is_referee', 'is_starter', 'minutes',
+               'point', 't2_attempt', 't2', 't3_attempt', 't3', 't1_attempt', 't1', 'defensive_reb', 'offensive_reb',
+               'assist', 'steal', 'turnover', 'counterattack', 'block', 'received_block', 'dunk', 'fault',
+               'received_fault', 'plus_minus', 'efficiency']
+NONE_FIELDS = {'number', 'first_name', 'last_name'}  # they are None until they are found in the page.
+GAME_FIELDS = ['acbid', 'team_home_id', 'team_away_id', 'competition_phase', 'round_phase', 'journey', 'venue',
+               'attendance', 'kickoff_time', 'score_home', 'score_away', 'score_home_first', 'score_away_first',
+               'score_home_second', 'score_away_second', 'score_home_third', 'score_away_third', 'score_home_fourth',
+               'score_away_fourth', 'score_home_extra', 'score_away_extra', 'page_sha1']  # the columns of game.
+
+
+class Record:
+    """
+    Base of the slotted records. A record can be used as a dict of its fields, e.g. stat_line['point'] = 10, and its
+    missing fields are None.
+    """
+    __slots__ = []
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        :param values: dict, the fields that are not of the record are ignored.
+        :return: Record
+        """
+        return cls(**values)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def values(self, fields):
+        """
+        :param fields: list of Strings
+        :return: tuple, e.g. the parameters of an insert.
+        """
+        return tuple(getattr(self, field) for field in fields)
+
+    def replace(self, **values):
+        """
+        :return: Record, a copy with some fields changed.
+        """
+        return type(self)(**dict(self.to_dict(), **values))
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        setattr(self, field, value)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.values(self.__slots__) == other.values(other.__slots__)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join('{}={!r}'.format(field, value)
+                                                              for field, value in self.to_dict().items()
+                                                              if value is not None))
+
+
+class StatLine(Record):
+    """
+    The stats of a participant in a game. `id` is the acbid of the actor (None for the 'Equipo' row) and `team` is 0
+    for the home team and 1 for the away team. The stats that are not in the page (e.g. the +/- in the old games) are
+    None.
+    """
+    __slots__ = ['id', 'team'] + STAT_FIELDS
+
+    @staticmethod
+    def with_stats(fields):
+        """
+        Create a stat line where the stats of the page start at 0, as it is filled cell by cell.
+
+        :param fields: iterable of Strings, the fields in the header of the page.
+        :return: StatLine
+        """
+        return StatLine(**{field: None if field in NONE_FIELDS else 0 for field in fields})
+
+    def values(self, fields=STAT_FIELDS):
+        return super().values(fields)
+
+
+class Referee(Record):
+    """
+    A referee of a game. We only have their name, the rest of the fields of their participation are None.
+    """
+    __slots__ = ['display_name']
+
+    def values(self, fields=STAT_FIELDS):
+        return tuple(self.display_name if field == 'display_name' else 1 if field == 'is_referee' else None
+                     for field in fields)
+
+
+class GameRow(Record):
+    """
+    A game, with the columns of the game table. The ids of the teams are None until the names of the teams are
+    resolved, and `id` until the game is in the database.
+    """
+    __slots__ = ['id'] + GAME_FIELDS
+
+    def values(self, fields=GAME_FIELDS):
+        return super().values(fields)
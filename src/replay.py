@@ -0,0 +1,148 @@
+import os, time, gzip, random, hashlib, threading, logging, argparse, urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from src.download import read_content
+from src.constants import FIRST_SEASON
+
+
+def corpus_path(corpus, path, query):
+    """
+    Map an acb.com url to the page recorded in the corpus. The corpus has the same layout as the data folder,
+    so a previous download (plain files or archives) can be replayed.
+
+    :param corpus: String, root of the corpus.
+    :param path: String, path of the url, e.g. '/stspartido.php'
+    :param query: dict with the parameters of the url.
+    :return: String, or None if the url is not an acb.com page we know.
+    """
+    page = os.path.basename(path)
+    if page == 'stspartido.php':
+        season = int(query['cod_edicion']) + FIRST_SEASON - 1
+        return os.path.join(corpus, str(season), 'games', query['partido'] + '.html')
+    elif page == 'resulcla.php':
+        season = int(query['codigo'].split('-')[1]) + FIRST_SEASON - 1
+        filename = 'teams.html' if query.get('jornada') == '2' else 'relegation_playoff.html'
+        return os.path.join(corpus, str(season), filename)
+    elif page == 'playoff.php':
+        season = int(query['cod_edicion']) + FIRST_SEASON - 1
+        return os.path.join(corpus, str(season), 'playoff.html')
+    elif page == 'jugador.php':
+        return os.path.join(corpus, 'actors', 'players', query['id'] + '.html')
+    elif page == 'entrenador.php':
+        return os.path.join(corpus, 'actors', 'coaches', query['id'] + '.html')
+    elif page == 'club.php':
+        return os.path.join(corpus, 'teams', query['id'] + '.html')
+    return None
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """
+    Serves the recorded pages like acb.com does, with gzip, ETag and conditional requests, and injects the faults
+    configured in the server.
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive connections.
+
+    def do_GET(self):
+        server = self.server
+        parts = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+
+        if server.latency:
+            time.sleep(random.uniform(0, 2 * server.latency))
+
+        roll = random.random()
+        if roll < server.error_rate:
+            return self._send(random.choice([500, 502, 503]), b'<html><title>Service Unavailable</title></html>')
+        if roll < server.error_rate + server.not_found_rate:
+            return self._send(404, b'<html><head><title>404 Not Found</title></head></html>')
+
+        try:
+            content = read_content(corpus_path(server.corpus, parts.path, query)).encode('utf-8')
+        except (FileNotFoundError, KeyError, ValueError, TypeError):
+            return self._send(404, b'<html><head><title>404 Not Found</title></head></html>')
+
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, b'', {'ETag': etag})
+
+        headers = {'ETag': etag, 'Content-Type': 'text/html; charset=utf-8'}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content)
+            headers['Content-Encoding'] = 'gzip'
+        self._send(200, content, headers)
+
+    def _send(self, status, body, headers=None):
+        server = self.server
+        with server.lock:
+            server.requests[status] = server.requests.get(status, 0) + 1
+
+        self.send_response(status)
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if server.body_rate and body:  # slow body, sent in chunks at body_rate bytes per second.
+            chunk_size = max(1, server.body_rate // 10)
+            for start in range(0, len(body), chunk_size):
+                self.wfile.write(body[start:start + chunk_size])
+                self.wfile.flush()
+                time.sleep(0.1)
+        else:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format % args)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Local stand-in of acb.com serving a recorded corpus. Point the crawler to it by overriding
+    `src.season.BASE_URL` with `server.base_url`.
+
+    :param corpus: String, folder with the same layout as the data folder.
+    :param latency: float, mean latency added to every response, in seconds.
+    :param error_rate: float, fraction of responses that are a 5xx error.
+    :param not_found_rate: float, fraction of responses that are a 404.
+    :param body_rate: int, bytes per second of the bodies. 0 means no limit.
+    """
+    daemon_threads = True
+
+    def __init__(self, corpus, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, not_found_rate=0.0,
+                 body_rate=0):
+        super().__init__((host, port), ReplayHandler)
+        self.corpus = corpus
+        self.latency = latency
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.body_rate = body_rate
+        self.requests = dict()  # number of responses per status.
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return 'http://{}:{}/'.format(*self.server_address[:2])
+
+    def start(self):
+        """
+        Serve in a background thread.
+
+        :return: ReplayServer
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", action='store', dest="corpus", default=os.path.join('..', 'data'))
+    parser.add_argument("--port", action='store', dest="port", default=8000, type=int)
+    parser.add_argument("--latency", action='store', dest="latency", default=0.0, type=float)
+    parser.add_argument("--error-rate", action='store', dest="error_rate", default=0.0, type=float)
+    parser.add_argument("--not-found-rate", action='store', dest="not_found_rate", default=0.0, type=float)
+    parser.add_argument("--body-rate", action='store', dest="body_rate", default=0, type=int)
+    args = parser.parse_args()
+
+    server = ReplayServer(args.corpus, port=args.port, latency=args.latency, error_rate=args.error_rate,
+                          not_found_rate=args.not_found_rate, body_rate=args.body_rate)
+    print('Replaying {} at {}'.format(args.corpus, server.base_url))
+    server.serve_forever()
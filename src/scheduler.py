@@ -0,0 +1,164 @@
+import time, random, socket, threading, logging, urllib.error, urllib.parse, http.client
+from collections import namedtuple
+
+DeadLetter = namedtuple('DeadLetter', ['url', 'error'])
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}  # transient errors worth retrying.
+THROTTLE_STATUS = {429, 503}  # the server is asking us to slow down.
+
+
+class HostLimiter:
+    """
+    Limits the requests sent to a host with a token bucket (requests per second) and an adaptive number of
+    concurrent requests.
+
+    The concurrency follows an AIMD policy: it grows by one every `limit` fast successful responses and it is halved
+    when a request fails because of congestion or is slower than the target latency, at most once per target latency.
+    When the host explicitly throttles us (429/503), the rate of the bucket is halved as well, and it recovers
+    additively (by 1/rate) with every success.
+    """
+    def __init__(self, rate=10.0, max_rate=20.0, min_rate=0.5, concurrency=4, min_concurrency=1,
+                 max_concurrency=16, target_latency=2.0):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.tokens = rate
+        self.in_flight = 0
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        # Bursts of one second, and at least one request even if the rate is below one per second.
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """
+        Wait until a request can be sent to the host.
+        """
+        with self._condition:
+            while True:
+                self._refill()
+                if self.in_flight < int(self.limit) and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                wait = (1 - self.tokens) / self.rate if self.tokens < 1 else None
+                self._condition.wait(timeout=wait)
+
+    def release(self, latency, ok=True, throttled=False):
+        """
+        Free the slot of a finished request and adapt the limits.
+
+        :param latency: float, seconds
+        :param ok: bool, the request succeeded. None if it failed without a sign of congestion (e.g. a 404): the slot
+        is freed and the limits are kept.
+        :param throttled: bool, the host answered with a 429 or a 503.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if ok is None:
+                pass
+            elif ok and latency <= self.target_latency:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                self.rate = min(self.max_rate, self.rate + 1.0 / self.rate)
+            elif now - self._last_decrease >= self.target_latency:
+                # The requests in flight fail together, they only count as one congestion signal.
+                self._last_decrease = now
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                if throttled:
+                    self.rate = max(self.min_rate, self.rate / 2)
+            self._condition.notify_all()
+
+
+class Scheduler:
+    """
+    Sends the requests through the limiter of their host, retrying the transient errors with a jittered exponential
+    backoff. The urls that keep failing after all the retries are kept in `dead_letters` (download_many records them
+    in the manifest as well).
+    """
+    def __init__(self, max_retries=5, backoff_base=0.5, backoff_cap=30.0, **limiter_kwargs):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.limiter_kwargs = limiter_kwargs
+        self.limiters = dict()
+        self.dead_letters = []
+        self._lock = threading.Lock()
+
+    def get_limiter(self, host):
+        with self._lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(**self.limiter_kwargs)
+            return self.limiters[host]
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Time to wait before the next attempt ("full jitter" exponential backoff).
+
+        :param attempt: int, starting at 0.
+        :param retry_after: String, Retry-After header sent by the server.
+        :return: float, seconds
+        """
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        try:
+            return max(delay, min(self.backoff_cap, float(retry_after)))
+        except (TypeError, ValueError):
+            return delay
+
+    @staticmethod
+    def is_retryable(error):
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code in RETRY_STATUS
+        return isinstance(error, (urllib.error.URLError, socket.timeout, ConnectionError, http.client.HTTPException))
+
+    @staticmethod
+    def is_congestion(error):
+        """
+        Timeouts, connection errors, 5xx and throttling mean the host is overloaded. A permanent client error (e.g. the
+        404 of a missing actor) is a normal answer.
+
+        :param error: Exception
+        :return: bool
+        """
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code >= 500 or error.code == 408 or error.code in THROTTLE_STATUS
+        return isinstance(error, (urllib.error.URLError, socket.timeout, ConnectionError, http.client.HTTPException))
+
+    def call(self, url, request):
+        """
+        Send a request to a url.
+
+        :param url: String
+        :param request: function without arguments that sends the request.
+        :return: whatever the request returns.
+        """
+        logger = logging.getLogger(__name__)
+        limiter = self.get_limiter(urllib.parse.urlsplit(url).netloc)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = request()
+            except Exception as error:
+                status = getattr(error, 'code', None)
+                limiter.release(time.monotonic() - start, ok=False if self.is_congestion(error) else None,
+                                throttled=status in THROTTLE_STATUS)
+                if not self.is_retryable(error) or attempt == self.max_retries:
+                    with self._lock:
+                        self.dead_letters.append(DeadLetter(url, repr(error)))
+                    raise
+                headers = getattr(error, 'headers', None)
+                delay = self.backoff(attempt, headers.get('Retry-After') if headers else None)
+                logger.warning('{} failed ({}), retrying in {:.1f}s'.format(url, error, delay))
+                time.sleep(delay)
+            else:
+                limiter.release(time.monotonic() - start)
+                return result
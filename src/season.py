@@ -1,10 +1,10 @@
-import os, re
+import os, re, json, hashlib
 import numpy as np
 from pyquery import PyQuery as pq
 from src.download import validate_dir, open_or_download
+from src.constants import FIRST_SEASON, get_season_code
 
-
-FIRST_SEASON = 1956
+METADATA_VERSION = 2  # the files of previous versions are ignored, e.g. the version 1 sorted the ids of the teams.
 BASE_URL = 'http://www.acb.com/'
 DATA_PATH = '../data'
 TEAMS_PATH = os.path.join(DATA_PATH, 'teams')
@@ -21,25 +21,99 @@ validate_dir(COACHES_PATH)
 class Season:
     def __init__(self, season):
         self.season = season
-        self.season_id = season - FIRST_SEASON + 1  # First season in 1956 noted as 1.
+        self.season_id = get_season_code(season)  # First season in 1956 noted as 1.
         self.SEASON_PATH = os.path.join(DATA_PATH, str(self.season))
         self.GAMES_PATH = os.path.join(self.SEASON_PATH, 'games')
+        self.METADATA_PATH = os.path.join(self.SEASON_PATH, 'metadata.json')
         validate_dir(self.SEASON_PATH)
         validate_dir(self.GAMES_PATH)
 
         self.relegation_playoff_seasons = [1994, 1995, 1996, 1997]
         self.missing_playoff_format = [1994, 1995]
+        self.mismatched_teams = []
+
+        """
+        The metadata of a season (number of teams, ids of the teams, playoff format...) is extracted from a few
+        pages, only once. It is kept in memory and persisted in a metadata file, together with the hash of the pages
+        it comes from. If a page changes, the metadata derived from it is extracted again. The metadata keeps the order
+        of the pages, e.g. the teams are created in the order of the standing page.
+        """
+        self._pages = dict()
+        self._metadata = self._load_metadata()
+        self._memo = dict()
+
         self.num_teams = self.get_number_teams()
         self.playoff_format = self.get_playoff_format()
-        self.mismatched_teams = []
 
-    def save_teams(self):
-        filename = os.path.join(self.SEASON_PATH, 'teams' + '.html')
+    def _load_metadata(self):
+        try:
+            with open(self.METADATA_PATH, 'r') as file:
+                metadata = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {'version': METADATA_VERSION}
+        if metadata.get('version') != METADATA_VERSION:
+            return {'version': METADATA_VERSION}
+        return metadata
+
+    def _save_metadata(self):
+        tmp_path = self.METADATA_PATH + '.part'
+        with open(tmp_path, 'w') as file:
+            json.dump(self._metadata, file, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.METADATA_PATH)
+
+    def _get_page(self, name, url):
+        """
+        Open or download a page of the season, once.
+
+        :param name: String, name of the file without extension.
+        :param url: String
+        :return: content of the page.
+        """
+        if name not in self._pages:
+            self._pages[name] = open_or_download(file_path=os.path.join(self.SEASON_PATH, name + '.html'), url=url)
+        return self._pages[name]
+
+    def _get_metadata(self, key, pages, extract):
+        """
+        Get a piece of metadata, extracting it only if it isn't cached or its source pages have changed.
+
+        :param key: String
+        :param pages: dict {name: url} of the pages the metadata is extracted from.
+        :param extract: function without arguments that extracts the metadata.
+        :return: metadata
+        """
+        if key not in self._memo:
+            sources = {name: hashlib.sha1(self._get_page(name, url).encode('utf-8')).hexdigest()
+                       for name, url in pages.items()}
+            cached = self._metadata.get(key)
+            if cached is not None and cached['sources'] == sources:
+                self._memo[key] = cached['value']
+            else:
+                self._memo[key] = extract()
+                self._metadata[key] = {'sources': sources, 'value': self._memo[key]}
+                self._save_metadata()
+        return self._memo[key]
+
+    def _teams_page(self):
         # There is a bug in 2007 that the first journey has duplicated teams.
-        url = BASE_URL + "resulcla.php?codigo=LACB-{}&jornada=2".format(self.season_id)
-        return open_or_download(file_path=filename, url=url)
+        return {'teams': BASE_URL + "resulcla.php?codigo=LACB-{}&jornada=2".format(self.season_id)}
+
+    def _playoff_page(self):
+        if self.season in self.missing_playoff_format:
+            return dict()
+        return {'playoff': BASE_URL + "playoff.php?cod_competicion=LACB&cod_edicion={}".format(self.season_id)}
+
+    def _relegation_page(self):
+        return {'relegation_playoff': BASE_URL + "resulcla.php?codigo=LACB-{}&jornada={}".format(
+            self.season_id, (self.get_number_teams() - 1) * 2)}
+
+    def save_teams(self):
+        return self._get_page('teams', self._teams_page()['teams'])
 
     def get_number_teams(self):
+        return self._get_metadata('num_teams', self._teams_page(), self._extract_number_teams)
+
+    def _extract_number_teams(self):
         content = self.save_teams()
         teams_match = re.findall(r'<td class="rojo" align="right"><b>([0-9]+)</b>', content, re.DOTALL)
         if len(teams_match) == 0:  # from 1994 and backward there isn't standings, we just count the games
@@ -48,6 +122,9 @@ class Season:
             return len(teams_match)
 
     def get_teams_ids(self):
+        return self._get_metadata('teams_ids', self._teams_page(), self._extract_teams_ids)
+
+    def _extract_teams_ids(self):
         content = self.save_teams()
         teams_doc = pq(content)
         teams_tag = '.resultados2'
@@ -69,12 +146,13 @@ class Season:
         return round_format
 
     def get_playoff_format(self):
+        return self._get_metadata('playoff_format', self._playoff_page(), self._extract_playoff_format)
+
+    def _extract_playoff_format(self):
         if self.season in self.missing_playoff_format:
             return [3, 5, 5]  # page 32 in http://www.acb.com/publicaciones/guia1995
         else:
-            filename = os.path.join(self.SEASON_PATH, 'playoff.html')
-            url = BASE_URL + "playoff.php?cod_competicion=LACB&cod_edicion={}".format(self.season_id)
-            content = open_or_download(file_path=filename, url=url)
+            content = self._get_page('playoff', self._playoff_page()['playoff'])
 
             playoff_format = list()
             playoff_format.append(self.get_playoff_round_format(content, "#columnacuartos"))
@@ -83,28 +161,47 @@ class Season:
             return playoff_format
 
     def get_number_games_regular_season(self):
-        return (self.num_teams - 1) * self.num_teams
+        return self.get_games_breakdown()['regular']
 
     def get_number_games_playoff(self):
-        games_per_round = [4, 2, 1]  # Quarter-finals, semifinals, final.
-        return sum(np.array(self.playoff_format) * np.array(games_per_round))  # Element-wise multiplication.
+        return self.get_games_breakdown()['playoff']
 
     def get_number_games(self):
-        return self.get_number_games_regular_season() + self.get_number_games_playoff() + self.get_number_games_relegation_playoff()
+        return sum(self.get_games_breakdown().values())
 
     def get_number_games_relegation_playoff(self):
-        return 5*2 if self.season in self.relegation_playoff_seasons else 0
+        return self.get_games_breakdown()['relegation_playoff']
+
+    def get_games_breakdown(self):
+        """
+        Number of games of each phase of the season.
+
+        :return: dict {phase: number of games}
+        """
+        pages = dict(self._teams_page(), **self._playoff_page())
+        return self._get_metadata('games_breakdown', pages, self._extract_games_breakdown)
+
+    def _extract_games_breakdown(self):
+        num_teams = self.get_number_teams()
+        games_per_round = [4, 2, 1]  # Quarter-finals, semifinals, final.
+        return {
+            'regular': (num_teams - 1) * num_teams,
+            'playoff': int(sum(np.array(self.get_playoff_format()) * np.array(games_per_round))),  # Element-wise.
+            'relegation_playoff': 5*2 if self.season in self.relegation_playoff_seasons else 0,
+        }
 
     def get_relegation_teams(self):
         if self.season <= 1994:
             return {1994: ['VALVI GIRONA', 'BREOGÁN LUGO', 'PAMESA VALENCIA', 'SOMONTANO HUESCA']}[self.season]
         else:
-            filename = os.path.join(self.SEASON_PATH, 'relegation_playoff.html')
-            url = BASE_URL + "resulcla.php?codigo=LACB-{}&jornada={}".format(self.season_id, (self.get_number_teams()-1)*2)
-            content = open_or_download(file_path=filename, url=url)
-            doc = pq(content)
-            relegation_teams = []
-            for team_id in range(self.get_number_teams()-4, self.get_number_teams()):
-                relegation_teams.append(doc('.negro').eq(team_id).text().upper())
-
-            return relegation_teams
\ No newline at end of file
+            return self._get_metadata('relegation_teams', self._relegation_page(), self._extract_relegation_teams)
+
+    def _extract_relegation_teams(self):
+        content = self._get_page('relegation_playoff', self._relegation_page()['relegation_playoff'])
+        doc = pq(content)
+        num_teams = self.get_number_teams()
+        relegation_teams = []
+        for team_id in range(num_teams-4, num_teams):
+            relegation_teams.append(doc('.negro').eq(team_id).text().upper())
+
+        return relegation_teams
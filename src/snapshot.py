@@ -0,0 +1,290 @@
+"""
+Columnar snapshot of the database for the analysis: every column of the participant, game, actor and team tables is
+a typed NumPy array in its own .npy file, which is memory-mapped when the snapshot is opened. Hence, opening it is
+instant and the columns are read lazily from the page cache, without copies.
+
+The columns are typed by their declared type in the schema:
+
+ - ids and foreign keys: int32, NULL as -1.
+ - INTEGER and BOOLEAN: the smallest integer type, or float32 with NULL as NaN if the column has NULLs (e.g. the +/-
+   of the old games).
+ - REAL: float64, NULL as NaN.
+ - TIMESTAMP: datetime64[s], NULL as NaT.
+ - TEXT: dictionary encoded, int32 codes into <column>.dict.json, NULL as -1.
+
+The participants are sorted by game and actor. participant/game_offsets.npy has the range of the participants of each
+game (in the order of game/id.npy), and participant/actor_order.npy with participant/actor_offsets.npy the ones of
+each actor (in the order of actor/id.npy).
+"""
+import os, json, shutil, sqlite3
+import numpy as np
+from src.constants import get_season
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PATH = os.path.join('..', 'data', 'snapshot')
+TABLES = {'game': 'id', 'actor': 'id', 'team': 'id', 'participant': 'game_id, actor_id, id'}  # and their order.
+INTEGER_TYPES = [np.int8, np.int16, np.int32, np.int64]
+NULL_ID = -1
+
+
+def _encode_column(values, declared_type, is_id):
+    """
+    Convert the values of a column from SQLite into a typed array.
+
+    :param values: list
+    :param declared_type: String, e.g. 'INTEGER'
+    :param is_id: bool, if it is the primary key or a foreign key.
+    :return: (array, dictionary) tuple, where dictionary is the list of strings of a TEXT column and None otherwise.
+    """
+    if is_id:
+        return np.array([NULL_ID if value is None else value for value in values], dtype=np.int32), None
+
+    if declared_type == 'TEXT':
+        dictionary, codes = dict(), []
+        for value in values:
+            codes.append(NULL_ID if value is None else dictionary.setdefault(str(value), len(dictionary)))
+        return np.array(codes, dtype=np.int32), list(dictionary)
+
+    if declared_type == 'TIMESTAMP':  # peewee stores them as text, but they might be seconds since epoch.
+        return np.array([np.datetime64('NaT') if value is None else
+                         np.datetime64(int(value), 's') if isinstance(value, (int, float)) else
+                         np.datetime64(str(value).replace(' ', 'T')[:19], 's') for value in values],
+                        dtype='datetime64[s]'), None
+
+    numbers = []
+    for value in values:
+        try:
+            numbers.append(np.nan if value is None else float(value))
+        except ValueError:  # a stat of acb with text instead of a number.
+            numbers.append(np.nan)
+    numbers = np.array(numbers, dtype=np.float64)
+
+    if declared_type == 'REAL':
+        return numbers, None
+    if np.isnan(numbers).any() or (numbers != np.round(numbers)).any():
+        return numbers.astype(np.float32), None
+    for integer_type in INTEGER_TYPES:
+        info = np.iinfo(integer_type)
+        if not len(numbers) or (numbers.min() >= info.min and numbers.max() <= info.max):
+            return numbers.astype(integer_type), None
+
+
+def _offsets(keys, positions_of, size):
+    """
+    Offsets of the rows of each key in an array sorted by key.
+
+    :param keys: array of ids, sorted.
+    :param positions_of: array of the ids of the other table, sorted.
+    :param size: int, number of rows of the other table.
+    :return: array of size + 1 offsets, the rows of the i-th id are [offsets[i], offsets[i + 1]).
+    """
+    counts = np.bincount(np.searchsorted(positions_of, keys[keys != NULL_ID]), minlength=size)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def export_snapshot(db_path, snapshot_path=SNAPSHOT_PATH):
+    """
+    Export the tables of a database into a snapshot. The previous snapshot is replaced once the new one is complete.
+
+    :param db_path: String
+    :param snapshot_path: String
+    """
+    tmp_path = snapshot_path + '.part'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    meta = {'version': SNAPSHOT_VERSION, 'tables': dict()}
+    connection = sqlite3.connect(db_path)
+    try:
+        for table, order in TABLES.items():
+            os.makedirs(os.path.join(tmp_path, table))
+            info = connection.execute('PRAGMA table_info({})'.format(table)).fetchall()
+            columns = [row[1] for row in info]
+            rows = connection.execute('SELECT {} FROM {} ORDER BY {}'.format(', '.join(columns), table,
+                                                                              order)).fetchall()
+
+            meta['tables'][table] = {'rows': len(rows), 'columns': dict()}
+            for cont, (_, column, declared_type, _, _, is_primary_key) in enumerate(info):
+                array, dictionary = _encode_column([row[cont] for row in rows], declared_type.upper(),
+                                                   is_primary_key or column.endswith('_id'))
+                np.save(os.path.join(tmp_path, table, column + '.npy'), array)
+                if dictionary is not None:
+                    with open(os.path.join(tmp_path, table, column + '.dict.json'), 'w') as file:
+                        json.dump(dictionary, file, ensure_ascii=False)
+                meta['tables'][table]['columns'][column] = {'dtype': str(array.dtype),
+                                                            'dictionary': dictionary is not None}
+    finally:
+        connection.close()
+
+    def load(table, column):
+        return np.load(os.path.join(tmp_path, table, column + '.npy'))
+
+    # The first two digits of the acbid of a game are the code of its season.
+    with open(os.path.join(tmp_path, 'game', 'acbid.dict.json')) as file:
+        game_acbids = json.load(file)
+    seasons = np.array([get_season(acbid) for acbid in game_acbids], dtype=np.int16)
+    np.save(os.path.join(tmp_path, 'game', 'season.npy'), seasons[load('game', 'acbid')])
+    meta['tables']['game']['columns']['season'] = {'dtype': 'int16', 'dictionary': False}
+
+    game_ids, actor_ids = load('game', 'id'), load('actor', 'id')
+    participant_games, participant_actors = load('participant', 'game_id'), load('participant', 'actor_id')
+    extra_columns = {
+        'game_index': np.searchsorted(game_ids, participant_games).astype(np.int32),
+        'actor_index': np.where(participant_actors == NULL_ID, NULL_ID,
+                                np.searchsorted(actor_ids, participant_actors)).astype(np.int32),
+        'game_offsets': _offsets(participant_games, game_ids, len(game_ids)),
+        'actor_order': np.lexsort((participant_games, participant_actors))[
+            np.count_nonzero(participant_actors == NULL_ID):].astype(np.int32),
+        'actor_offsets': _offsets(np.sort(participant_actors), actor_ids, len(actor_ids))}
+    for column, array in extra_columns.items():
+        np.save(os.path.join(tmp_path, 'participant', column + '.npy'), array)
+        meta['tables']['participant']['columns'][column] = {'dtype': str(array.dtype), 'dictionary': False}
+
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as file:
+        json.dump(meta, file, indent=2)
+
+    shutil.rmtree(snapshot_path, ignore_errors=True)
+    os.replace(tmp_path, snapshot_path)
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot. The columns are memory-mapped the first time they are used.
+
+    E.g. the points per game of the players in each season:
+
+        snapshot = Snapshot('../data/snapshot')
+        players = snapshot.players()
+        seasons, means = snapshot.group_mean('point', by='season', mask=players)
+    """
+    def __init__(self, snapshot_path=SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        with open(os.path.join(snapshot_path, 'meta.json')) as file:
+            self.meta = json.load(file)
+        if self.meta['version'] != SNAPSHOT_VERSION:
+            raise ValueError('{} has version {}, expected {}'.format(snapshot_path, self.meta['version'],
+                                                                     SNAPSHOT_VERSION))
+        self._columns = dict()
+        self._dictionaries = dict()
+
+    def column(self, table, column):
+        """
+        Get a column, memory-mapped.
+
+        :param table: String
+        :param column: String
+        :return: numpy array
+        """
+        if (table, column) not in self._columns:
+            if column not in self.meta['tables'][table]['columns']:
+                raise KeyError('{} is not a column of {}'.format(column, table))
+            self._columns[(table, column)] = np.load(os.path.join(self.snapshot_path, table, column + '.npy'),
+                                                     mmap_mode='r')
+        return self._columns[(table, column)]
+
+    def dictionary(self, table, column):
+        """
+        Get the strings of a dictionary encoded column.
+
+        :param table: String
+        :param column: String
+        :return: numpy array of objects, indexed by the codes of the column.
+        """
+        if (table, column) not in self._dictionaries:
+            with open(os.path.join(self.snapshot_path, table, column + '.dict.json')) as file:
+                self._dictionaries[(table, column)] = np.array(json.load(file), dtype=object)
+        return self._dictionaries[(table, column)]
+
+    def decode(self, table, column, rows=slice(None)):
+        """
+        Get the strings of some rows of a dictionary encoded column, None for NULL.
+
+        :param table: String
+        :param column: String
+        :param rows: slice, index array or mask.
+        :return: numpy array of objects
+        """
+        codes = np.asarray(self.column(table, column)[rows])
+        return np.where(codes == NULL_ID, None, self.dictionary(table, column)[np.maximum(codes, 0)])
+
+    def game_participants(self, game_id):
+        """
+        Rows of the participants of a game.
+
+        :param game_id: int
+        :return: slice
+        """
+        index = np.searchsorted(self.column('game', 'id'), game_id)
+        offsets = self.column('participant', 'game_offsets')
+        return slice(int(offsets[index]), int(offsets[index + 1]))
+
+    def actor_participants(self, actor_id):
+        """
+        Rows of the participations of an actor, in the order of the games.
+
+        :param actor_id: int
+        :return: numpy array of row numbers.
+        """
+        index = np.searchsorted(self.column('actor', 'id'), actor_id)
+        offsets = self.column('participant', 'actor_offsets')
+        return self.column('participant', 'actor_order')[offsets[index]:offsets[index + 1]]
+
+    def players(self):
+        """
+        Mask of the participants that are players, i.e. neither coaches, referees nor the 'Equipo' row.
+
+        :return: numpy array of bools
+        """
+        return ((self.column('participant', 'is_coach') == 0) & (self.column('participant', 'is_referee') == 0) &
+                (self.column('participant', 'actor_id') != NULL_ID))
+
+    def _group_keys(self, by):
+        """
+        :param by: String, 'actor', 'team' or 'season'.
+        :return: (array with the group of each participant, function from groups to their keys)
+        """
+        if by == 'actor':
+            actor_ids = self.column('actor', 'id')
+            return self.column('participant', 'actor_index'), lambda groups: np.asarray(actor_ids[groups])
+        if by == 'team':
+            return self.column('participant', 'team_id'), lambda groups: groups
+        if by == 'season':
+            seasons = self.column('game', 'season')[self.column('participant', 'game_index')]
+            first_season = seasons.min() if len(seasons) else 0
+            return seasons - first_season, lambda groups: groups + first_season
+        raise ValueError("Unknown group {}, expected 'actor', 'team' or 'season'".format(by))
+
+    def _group(self, column, by, mask):
+        groups, to_keys = self._group_keys(by)
+        values = np.asarray(self.column('participant', column), dtype=np.float64)
+        valid = (groups != NULL_ID) & ~np.isnan(values)
+        if mask is not None:
+            valid &= mask
+        groups, values = groups[valid], values[valid]
+        sums = np.bincount(groups, weights=values)
+        counts = np.bincount(groups, minlength=len(sums))
+        present = np.flatnonzero(counts)
+        return to_keys(present), sums[present], counts[present]
+
+    def group_sum(self, column, by, mask=None):
+        """
+        Sum of a stat of the participants by actor, team or season. NULLs are skipped.
+
+        :param column: String, e.g. 'point'.
+        :param by: String, 'actor', 'team' or 'season'.
+        :param mask: numpy array of bools, the participants taken into account, e.g. players().
+        :return: (keys, sums) arrays, where keys are the actor ids, team ids or seasons.
+        """
+        keys, sums, _ = self._group(column, by, mask)
+        return keys, sums
+
+    def group_mean(self, column, by, mask=None):
+        """
+        Mean of a stat of the participants by actor, team or season, e.g. the points per game. NULLs are skipped.
+
+        :param column: String, e.g. 'point'.
+        :param by: String, 'actor', 'team' or 'season'.
+        :param mask: numpy array of bools, the participants taken into account, e.g. players().
+        :return: (keys, means) arrays, where keys are the actor ids, team ids or seasons.
+        """
+        keys, sums, counts = self._group(column, by, mask)
+        return keys, sums / counts
@@ -0,0 +1,163 @@
+import os, json, datetime
+from collections import defaultdict
+from src.ingest import GameRecord
+from src.records import StatLine, Referee, GameRow
+
+try:
+    import pyarrow, pyarrow.parquet
+except ImportError:  # compact NDJSON is used instead.
+    pyarrow = None
+
+TABLES = ['games', 'participants', 'referees']
+SCORES = ['score_home', 'score_away']
+DATETIME_COLUMNS = ['kickoff_time']
+
+
+def staging_path(season):
+    """
+    Folder with the staging files of a season, e.g. ../data/2016/staging
+
+    :param season: Season
+    :return: String
+    """
+    return os.path.join(season.SEASON_PATH, 'staging')
+
+
+def _table_path(season, table, extension):
+    return os.path.join(staging_path(season), table + extension)
+
+
+def _to_tables(records):
+    """
+    Flatten the records of the games into three tables: games (including the names of the teams and the final
+    score), participants and referees. The rows of the participants and referees are linked to their game by the
+    id_game_number. A blank game only has the id_game_number and the hash of its page.
+
+    :param records: iterable of GameRecords
+    :return: dict {table: list of rows}
+    """
+    tables = {table: [] for table in TABLES}
+    for record in records:
+        game = {'id_game_number': record.id_game_number, 'sha1': record.sha1}
+        if record.game is not None:
+            game.update((field, value) for field, value in record.game.to_dict().items() if value is not None)
+            game.update(record.scores)
+            game['team_home_name'], game['team_away_name'] = record.team_names
+
+            for stat_line in record.participants:
+                participant = {field: value for field, value in stat_line.to_dict().items() if value is not None}
+                tables['participants'].append(dict(participant, id_game_number=record.id_game_number))
+            for referee in record.referees:
+                tables['referees'].append({'id_game_number': record.id_game_number,
+                                           'display_name': referee.display_name})
+        tables['games'].append(game)
+    return tables
+
+
+def _to_records(tables):
+    """
+    Inverse of _to_tables.
+
+    :param tables: dict {table: list of rows}
+    :return: list of GameRecords, in the order of the games.
+    """
+    participants = defaultdict(list)
+    for participant in tables['participants']:
+        participants[participant['id_game_number']].append(StatLine.from_dict(participant))
+
+    referees = defaultdict(list)
+    for referee in tables['referees']:
+        referees[referee['id_game_number']].append(Referee(display_name=referee['display_name']))
+
+    records = []
+    for game in tables['games']:
+        game = {key: value for key, value in game.items() if value is not None}
+        id_game_number = game.pop('id_game_number')
+        sha1 = game.pop('sha1', None)
+        if 'acbid' not in game:  # blank game.
+            records.append(GameRecord(id_game_number, None, None, None, None, None, sha1))
+            continue
+
+        for column in DATETIME_COLUMNS:
+            if isinstance(game.get(column), str):
+                game[column] = datetime.datetime.strptime(game[column], '%Y-%m-%dT%H:%M:%S')
+        team_names = [game.pop('team_home_name'), game.pop('team_away_name')]
+        scores = {key: game.pop(key) for key in SCORES if key in game}
+        records.append(GameRecord(id_game_number, team_names, GameRow.from_dict(game), participants[id_game_number],
+                                  scores, referees[id_game_number], sha1))
+    return records
+
+
+def _write_parquet(path, rows):
+    columns = list(dict.fromkeys(column for row in rows for column in row))  # e.g. +/- is only in the new layout.
+    pyarrow.parquet.write_table(pyarrow.Table.from_pylist([{column: row.get(column) for column in columns}
+                                                           for row in rows]), path)
+
+
+def _write_ndjson(path, rows):
+    with open(path, 'w') as file:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False, separators=(',', ':'), default=datetime.datetime.isoformat))
+            file.write('\n')
+
+
+def write_staging(season, records):
+    """
+    Write the records of the games of a season into its staging files. They are Parquet files if pyarrow is installed
+    and NDJSON files otherwise, or if the stats don't fit in typed columns.
+
+    :param season: Season
+    :param records: iterable of GameRecords
+    """
+    tables = _to_tables(records)
+    os.makedirs(staging_path(season), exist_ok=True)
+
+    extension = '.parquet' if pyarrow is not None else '.ndjson'
+    if pyarrow is not None:
+        try:
+            for table in TABLES:
+                _write_parquet(_table_path(season, table, '.parquet.part'), tables[table])
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):  # e.g. a stat with text instead of a number.
+            extension = '.ndjson'
+
+    for table in TABLES:
+        if extension == '.ndjson':
+            _write_ndjson(_table_path(season, table, '.ndjson.part'), tables[table])
+
+    # The files of the previous format are removed, and the new ones replace them at once.
+    for table in TABLES:
+        for old_extension in ['.parquet', '.ndjson', '.parquet.part']:
+            if old_extension != extension and os.path.exists(_table_path(season, table, old_extension)):
+                os.remove(_table_path(season, table, old_extension))
+        os.replace(_table_path(season, table, extension + '.part'), _table_path(season, table, extension))
+
+
+def has_staging(season):
+    """
+    Checks if a season has been extracted into staging files.
+
+    :param season: Season
+    :return: bool
+    """
+    return any(all(os.path.exists(_table_path(season, table, extension)) for table in TABLES)
+               for extension in ['.parquet', '.ndjson'])
+
+
+def read_staging(season):
+    """
+    Read the records of the games of a season from its staging files, without touching the pages.
+
+    :param season: Season
+    :return: list of GameRecords, in the order of the games.
+    """
+    tables = dict()
+    for table in TABLES:
+        if os.path.exists(_table_path(season, table, '.parquet')):
+            if pyarrow is None:
+                raise ImportError('{} is a Parquet file, please install pyarrow'.format(
+                    _table_path(season, table, '.parquet')))
+            tables[table] = pyarrow.parquet.read_table(_table_path(season, table, '.parquet')).to_pylist()
+        else:
+            with open(_table_path(season, table, '.ndjson'), 'r') as file:
+                tables[table] = [json.loads(line) for line in file]
+    return _to_records(tables)
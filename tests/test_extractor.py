@@ -0,0 +1,41 @@
+"""
+Equivalence of the extractor of the game pages (src.extractor) with the pyquery parser it replaced, over the frozen
+corpus of benchmarks/corpus: a season with the old statistics table (2003) and a season with the new one (2016).
+
+    $ python -m pytest tests
+"""
+import os, sys
+import pytest
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+from benchmarks.parse import reference_game, FIELDS, CORPUS_PATH
+from src.download import stored_files, read_content
+from src.game_page import GamePage
+
+LAYOUTS = {2003: 'estadisticas', 2016: 'estadisticasnew'}
+
+
+def _pages(year):
+    pages = []
+    for file_path in stored_files(os.path.join(CORPUS_PATH, str(year), 'games')):
+        content = read_content(file_path)
+        if not GamePage._is_blank(content):
+            pages.append(pytest.param(content, id='{}/{}'.format(year, os.path.basename(file_path))))
+    return pages
+
+
+@pytest.mark.parametrize('year', sorted(LAYOUTS))
+def test_layout(year):
+    pages = [GamePage(param.values[0]) for param in _pages(year)]
+    assert pages
+    assert all(game_page.estadisticas_tag == '.' + LAYOUTS[year] for game_page in pages)
+
+
+@pytest.mark.parametrize('content', [page for year in sorted(LAYOUTS) for page in _pages(year)])
+def test_same_fields_as_pyquery(content):
+    game_page = GamePage(content)
+    expected = reference_game(game_page.raw_game, game_page.estadisticas_tag)
+    for field, expected_value in zip(FIELDS, expected):
+        assert getattr(game_page, field) == expected_value, field